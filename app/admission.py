@@ -0,0 +1,176 @@
+# app/admission.py  (adaptive per-model concurrency limits and load shedding for chat)
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+
+CHAT_CONCURRENCY_INITIAL = float(os.getenv("CHAT_CONCURRENCY_INITIAL", "8"))
+CHAT_CONCURRENCY_MIN = float(os.getenv("CHAT_CONCURRENCY_MIN", "1"))
+CHAT_CONCURRENCY_MAX = float(os.getenv("CHAT_CONCURRENCY_MAX", "64"))
+CHAT_QUEUE_SIZE = int(os.getenv("CHAT_QUEUE_SIZE", "32"))
+CHAT_QUEUE_TIMEOUT_S = float(os.getenv("CHAT_QUEUE_TIMEOUT_S", "5"))
+# Completions slower than this count as a congestion signal, like a 429.
+CHAT_LATENCY_TARGET_S = float(os.getenv("CHAT_LATENCY_TARGET_S", "10"))
+CHAT_BACKOFF_RATIO = float(os.getenv("CHAT_BACKOFF_RATIO", "0.7"))
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed; `retry_after` is a hint in whole seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit with a bounded FIFO wait queue.
+
+    Each healthy completion raises the limit by 1/limit (about +1 per limit's worth of
+    requests); a 429 or a completion slower than `latency_target` multiplies it by
+    `backoff` (at most once per observed latency, so one burst is one cut). Requests
+    beyond the limit wait up to `queue_timeout` seconds; when `queue_size` are already
+    waiting, new ones are rejected at once.
+    """
+
+    def __init__(
+        self,
+        name,
+        initial=CHAT_CONCURRENCY_INITIAL,
+        min_limit=CHAT_CONCURRENCY_MIN,
+        max_limit=CHAT_CONCURRENCY_MAX,
+        queue_size=CHAT_QUEUE_SIZE,
+        queue_timeout=CHAT_QUEUE_TIMEOUT_S,
+        latency_target=CHAT_LATENCY_TARGET_S,
+        backoff=CHAT_BACKOFF_RATIO,
+    ):
+        self.name = name
+        self.min_limit = max(1.0, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(self.max_limit, max(self.min_limit, initial))
+        self.queue_size = max(0, queue_size)
+        self.queue_timeout = queue_timeout
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._avg_latency = None
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.timed_out = 0
+        self.decreases = 0
+
+    def _retry_after(self) -> int:
+        per_request = self._avg_latency or self.latency_target / 2
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(per_request * backlog / self.limit))
+
+    async def acquire(self) -> float:
+        """Wait for a slot; returns the admission time to pass back to release()."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._in_flight < int(self.limit) and not self._waiters:
+                self._in_flight += 1
+                self.admitted += 1
+                return time.monotonic()
+            if len(self._waiters) >= self.queue_size:
+                self.shed += 1
+                raise Overloaded(f"{self.name} is at capacity", self._retry_after())
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            self.queued += 1
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    self.timed_out += 1
+                    raise Overloaded(f"{self.name} queue wait timed out", self._retry_after())
+            # Granted just as the wait timed out: the slot is ours.
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                else:
+                    self._in_flight -= 1  # granted but never used
+                    self._grant()
+            raise
+        return time.monotonic()
+
+    def release(self, started: float, congested: bool = False, measured: bool = True) -> None:
+        """
+        Return a slot and feed the outcome (latency, 429/overload) into the limit. Pass
+        measured=False when the request ended before reaching the model, so it says
+        nothing about the model's capacity.
+        """
+        now = time.monotonic()
+        latency = now - started
+        with self._lock:
+            self._in_flight -= 1
+            if not measured:
+                self._grant()
+                return
+            self._avg_latency = latency if self._avg_latency is None else 0.8 * self._avg_latency + 0.2 * latency
+            if congested or latency > self.latency_target:
+                if now - self._last_decrease >= latency:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+                    self.decreases += 1
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._grant()
+
+    def _grant(self) -> None:
+        # Caller holds the lock. Waiters may belong to other event loops.
+        while self._waiters and self._in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            self._in_flight += 1
+            self.admitted += 1
+            try:
+                waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:  # its event loop is gone
+                self._in_flight -= 1
+                self.admitted -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self._in_flight,
+                "queued_now": len(self._waiters),
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "shed": self.shed,
+                "queue_timeouts": self.timed_out,
+                "decreases": self.decreases,
+                "avg_latency_s": round(self._avg_latency, 3) if self._avg_latency is not None else None,
+            }
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(True)
+
+
+def limiter_for(model_name: str) -> AdaptiveLimiter:
+    with _registry_lock:
+        limiter = _registry.get(model_name)
+        if limiter is None:
+            limiter = _registry[model_name] = AdaptiveLimiter(model_name)
+        return limiter
+
+
+def stats() -> dict:
+    with _registry_lock:
+        limiters = dict(_registry)
+    return {name: limiter.stats() for name, limiter in limiters.items()}
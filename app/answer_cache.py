@@ -0,0 +1,110 @@
+# app/answer_cache.py  (semantic answer cache for legal-mode questions)
+import os
+import threading
+import time
+
+import numpy as np
+
+LEGAL_CACHE_ENABLED = os.getenv("LEGAL_CACHE_ENABLED", "true").lower() not in {"0", "false", "no"}
+LEGAL_CACHE_THRESHOLD = float(os.getenv("LEGAL_CACHE_THRESHOLD", "0.95"))
+LEGAL_CACHE_SIZE = int(os.getenv("LEGAL_CACHE_SIZE", "256"))
+LEGAL_CACHE_TTL_S = float(os.getenv("LEGAL_CACHE_TTL_S", "86400"))
+
+
+def _normalize(vec):
+    unit = np.asarray(vec, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(unit))
+    return unit / norm if norm else None
+
+
+class SemanticAnswerCache:
+    """
+    Reuses an earlier answer when a new question's embedding has cosine similarity
+    >= `threshold` with a cached question. Entries are tied to the KB index version
+    (re-ingestion invalidates them) and bounded by `maxsize` and `ttl` seconds.
+
+    Cached questions are kept as one matrix of unit rows, so a lookup is a single
+    matrix-vector product. Lookups score a snapshot outside the lock and skip stale
+    entries; stores replace the matrix and entry list (never mutate them) and purge.
+    """
+
+    def __init__(self, threshold=LEGAL_CACHE_THRESHOLD, maxsize=LEGAL_CACHE_SIZE, ttl=LEGAL_CACHE_TTL_S):
+        self.threshold = threshold
+        self.maxsize = max(0, int(maxsize))
+        self.ttl = ttl
+        self._vectors = None  # (n, dim) float32 unit rows, oldest first
+        self._entries = []  # [version, answer, sources, expires_at], one per row of _vectors
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+
+    def _purge(self, version, now):
+        keep = [i for i, e in enumerate(self._entries) if e[0] == version and e[3] > now]
+        if len(keep) == len(self._entries):
+            return
+        self.invalidations += len(self._entries) - len(keep)
+        self._entries = [self._entries[i] for i in keep]
+        self._vectors = self._vectors[keep] if keep else None
+
+    def lookup(self, vec, version):
+        """Return {"answer", "sources", "similarity"} for the closest match, or None."""
+        unit = _normalize(vec)
+        if unit is None or self.maxsize == 0:
+            return None
+        with self._lock:
+            vectors, entries = self._vectors, self._entries
+        best, best_sim = None, self.threshold
+        if vectors is not None and vectors.shape[1] == unit.shape[0]:
+            sims = vectors @ unit
+            now = time.monotonic()
+            for i in np.flatnonzero(sims >= self.threshold):
+                entry = entries[i]
+                if entry[0] == version and entry[3] > now and sims[i] >= best_sim:
+                    best, best_sim = entry, float(sims[i])
+        with self._lock:
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return {"answer": best[1], "sources": list(best[2]), "similarity": best_sim}
+
+    def store(self, vec, version, answer, sources):
+        unit = _normalize(vec)
+        if unit is None or self.maxsize == 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._purge(version, now)
+            if self._vectors is not None and self._vectors.shape[1] != unit.shape[0]:
+                # A different embedding model: nothing cached is comparable any more.
+                self.invalidations += len(self._entries)
+                self._vectors, self._entries = None, []
+            vectors = unit[None, :] if self._vectors is None else np.vstack([self._vectors, unit])
+            entries = self._entries + [[version, answer, list(sources or []), now + self.ttl]]
+            excess = max(0, len(entries) - self.maxsize)
+            self._vectors, self._entries = vectors[excess:], entries[excess:]
+            self.stores += 1
+
+    def clear(self):
+        with self._lock:
+            self._vectors, self._entries = None, []
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": LEGAL_CACHE_ENABLED,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+legal_answer_cache = SemanticAnswerCache()
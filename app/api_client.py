@@ -1,6 +1,8 @@
 # app/api_client.py
+import asyncio
 import os
 import re
+import threading
 import time
 from dotenv import load_dotenv
 
@@ -9,6 +11,11 @@ load_dotenv()
 import google.generativeai as genai
 from google.api_core import exceptions as google_exceptions
 
+from app import context_packer
+from app.hedging import hedger
+from app.model_router import GENERATION_DEADLINE_S, QUOTA, backoff_delay, router
+from app.singleflight import SingleFlight
+
 API_KEY = os.getenv("GOOGLE_API_KEY")
 if not API_KEY:
     raise RuntimeError("GOOGLE_API_KEY missing! Set it inside .env")
@@ -36,70 +43,340 @@ I'm not a substitute for a professional — please talk to someone who can truly
 Are you safe right now?"""
 
 
+MENTAL_SYSTEM = (
+    "You are a warm, empathetic mental health companion. "
+    "You do NOT provide medical diagnoses or prescription advice. "
+    "If the user expresses suicidal ideation or self-harm intent, "
+    "provide crisis hotline numbers immediately. "
+    "Keep responses focused, compassionate, and under 150 words unless detail is truly needed."
+)
+
+LEGAL_SYSTEM = (
+    "You are a legal information assistant. "
+    "You provide general legal information only — never legal advice. "
+    "Always end with the disclaimer: *This is general information, not legal advice. "
+    "Consult a qualified lawyer for your specific situation.*"
+)
+
+# Identical (model, system, prompt) generations in flight at the same time share one call.
+_generations = SingleFlight("generation")
+
+# GenerativeModel handles keyed by (model name, system prompt); the system prompts are
+# fixed, so each pair is built once and reused for every turn.
+_models = {}
+_models_lock = threading.Lock()
+
+
 def detect_crisis(text: str) -> bool:
     return bool(CRISIS_PATTERNS.search(text))
 
 
+def _get_model(model_name: str, system: str = ""):
+    key = (model_name, system or "")
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            try:
+                model = genai.GenerativeModel(
+                    model_name,
+                    system_instruction=system if system else None,
+                )
+            except Exception:
+                model = genai.GenerativeModel(model_name)
+            _models[key] = model
+    return model
+
+
+def warm_models(model_name: str | None = None) -> None:
+    """Build the model handles for both assistant modes ahead of the first chat turn."""
+    for system in (MENTAL_SYSTEM, LEGAL_SYSTEM):
+        _get_model(model_name or DEFAULT_MODEL, system)
+
+
+QUOTA_MESSAGE = (
+    "Sorry — this model's quota is exceeded right now. "
+    "Try another model from the sidebar or try again later."
+)
+TRANSIENT_MESSAGE = "Temporary service issue. Please try again in a moment."
+ERROR_MESSAGE = "I'm having trouble generating an answer right now. Please try again later."
+FALLBACK_MESSAGES = {QUOTA_MESSAGE, TRANSIENT_MESSAGE, ERROR_MESSAGE}
+
+TRANSIENT_ERRORS = (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+)
+
+
 def _generate_safe(model_name: str, prompt: str, system: str = "", retries: int = 2) -> str:
-    """Call the model, retry on transient errors, return friendly message on quota issues."""
+    """
+    Call the model, retry on transient errors, return friendly message on quota issues.
+    On quota or persistent 5xx errors the request moves down the MODEL_FALLBACKS chain;
+    models whose circuit breaker is open are skipped.
+    """
+    return _generations.do((model_name, system, prompt), _generate_routed, model_name, prompt, system, retries)
+
+
+class _RoutedAttempt:
+    """
+    Calls to one model of the fallback chain, admitted by its breaker. Records each
+    outcome on the breaker and in the routing counters, and decides whether a failed call
+    is retried on this model. release() must run however the attempt ends (cancellation
+    and generator close included) so an unanswered half-open probe is handed back.
+    """
+
+    def __init__(self, route, name, position, breaker, probe):
+        self.route = route
+        self.name = name
+        self.position = position
+        self.breaker = breaker
+        self._probe = probe
+        self._attempt = 0
+
+    def succeeded(self) -> None:
+        self.breaker.record_success()
+        self._probe = False
+        router.count(self.name, "served" if self.position == 0 else "served_as_fallback")
+
+    def failed(self, error, can_retry=True):
+        """Record a quota or transient error; returns the backoff before retrying, or None to move on."""
+        self._probe = False
+        if isinstance(error, google_exceptions.ResourceExhausted):
+            print("Quota exhausted for model:", self.name, "->", error)
+            self.breaker.record_failure(trip=True)
+            router.count(self.name, "quota_errors")
+            self.route.failure = QUOTA_MESSAGE
+            return None
+        self.breaker.record_failure()
+        router.count(self.name, "transient_errors")
+        if not can_retry:
+            return None
+        delay = backoff_delay(self._attempt)
+        admitted = None
+        if self._attempt < self.route.retries and time.monotonic() + delay < self.route.deadline:
+            admitted = self.breaker.admit()
+        if admitted is None:
+            print("Transient generation error, moving on from", self.name, "->", error)
+            self.route.failure = TRANSIENT_MESSAGE
+            return None
+        self._probe = admitted
+        self._attempt += 1
+        return delay
+
+    def timed_out(self) -> None:
+        self.breaker.record_failure()
+        self._probe = False
+        router.count(self.name, "deadline_exceeded")
+        print("Generation deadline exceeded on", self.name)
+
+    def release(self) -> None:
+        if self._probe:
+            self._probe = False
+            self.breaker.release()
+
+
+class _Route:
+    """One request's walk down the fallback chain, shared by the sync, async and streaming callers."""
+
+    def __init__(self, model_name: str, retries: int):
+        # Errors that move a call down the chain (quota) or retry it (transient).
+        self.errors = (google_exceptions.ResourceExhausted, *TRANSIENT_ERRORS)
+        self.chain = router.chain(model_name)
+        self.retries = retries
+        self.deadline = time.monotonic() + GENERATION_DEADLINE_S
+        self.failure = TRANSIENT_MESSAGE  # the reply when every model fails
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def attempts(self):
+        """Yield an attempt for each model whose breaker admits a call, until the deadline."""
+        skipped = []
+        for position, name in enumerate(self.chain):
+            breaker = router.breaker(name)
+            probe = breaker.admit()
+            if probe is None:
+                router.count(name, "skipped_open")
+                skipped.append(breaker.cause)
+                continue
+            yield _RoutedAttempt(self, name, position, breaker, probe)
+            if time.monotonic() >= self.deadline:
+                router.count(name, "deadline_exceeded")
+                return
+        # Every breaker still open from quota errors: say so, not "temporary issue".
+        if len(skipped) == len(self.chain) and all(cause == QUOTA for cause in skipped):
+            self.failure = QUOTA_MESSAGE
+
+
+def _generate_routed(model_name: str, prompt: str, system: str, retries: int) -> str:
+    route = _Route(model_name, retries)
+    for attempt in route.attempts():
+        try:
+            model = _get_model(attempt.name, system)
+            while True:
+                try:
+                    resp = model.generate_content(prompt)
+                    text = getattr(resp, "text", str(resp)).strip()
+                except route.errors as e:
+                    delay = attempt.failed(e)
+                    if delay is None:
+                        break
+                    time.sleep(delay)
+                    continue
+                except Exception as e:
+                    print("Unexpected generation error:", e)
+                    return ERROR_MESSAGE
+                attempt.succeeded()
+                return text
+        finally:
+            attempt.release()
+    return route.failure
+
+
+async def _generate_safe_async(model_name: str, prompt: str, system: str = "", retries: int = 2) -> str:
+    """Async counterpart of _generate_safe; backoff sleeps without blocking the event loop."""
+    return await _generations.do_async(
+        (model_name, system, prompt), _generate_hedged_async, model_name, prompt, system, retries
+    )
+
+
+async def _timed(coro):
+    start = time.monotonic()
+    result = await coro
+    return result, time.monotonic() - start
+
+
+async def _generate_hedged_async(model_name: str, prompt: str, system: str, retries: int) -> str:
+    """
+    When HEDGE_ENABLED, a call still unanswered after the hedge delay gets a second
+    identical call (to HEDGE_MODEL if set); the first real answer wins and the other
+    call is cancelled. Hedges are limited to HEDGE_MAX_RATE of requests.
+    """
+    if not hedger.enabled:
+        return await _generate_routed_async(model_name, prompt, system, retries)
+
+    hedger.record_request()
+    primary = asyncio.ensure_future(_timed(_generate_routed_async(model_name, prompt, system, retries)))
     try:
-        model = genai.GenerativeModel(
-            model_name,
-            system_instruction=system if system else None,
-        )
-    except Exception:
-        model = genai.GenerativeModel(model_name)
-
-    attempt = 0
-    while True:
+        done, _ = await asyncio.wait({primary}, timeout=hedger.delay())
+    except asyncio.CancelledError:
+        primary.cancel()
+        raise
+    if done or not hedger.try_acquire():
+        text, elapsed = await primary
+        if text not in FALLBACK_MESSAGES:
+            hedger.record_latency(elapsed)
+        return text
+
+    hedge = asyncio.ensure_future(
+        _timed(_generate_routed_async(hedger.model or model_name, prompt, system, retries))
+    )
+    pending = {primary, hedge}
+    text = TRANSIENT_MESSAGE
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # A fast failure from one call should not beat a real answer still coming on the other.
+            for task in sorted(done, key=lambda t: t is hedge):
+                text, elapsed = task.result()
+                if text not in FALLBACK_MESSAGES:
+                    if task is hedge:
+                        hedger.record_win()
+                    else:
+                        hedger.record_latency(elapsed)
+                    return text
+        return text
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            # Let the loser unwind now, so a half-open probe it held is released before we return.
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def _generate_routed_async(model_name: str, prompt: str, system: str, retries: int) -> str:
+    route = _Route(model_name, retries)
+    for attempt in route.attempts():
         try:
-            resp = model.generate_content(prompt)
-            return getattr(resp, "text", str(resp)).strip()
-        except google_exceptions.ResourceExhausted as e:
-            print("Quota exhausted for model:", model_name, "->", e)
-            return (
-                "Sorry — this model's quota is exceeded right now. "
-                "Try another model from the sidebar or try again later."
-            )
-        except (
-            google_exceptions.ServiceUnavailable,
-            google_exceptions.DeadlineExceeded,
-            google_exceptions.InternalServerError,
-        ) as e:
-            if attempt >= retries:
-                print("Transient generation error, retries exhausted:", e)
-                return "Temporary service issue. Please try again in a moment."
-            time.sleep(1.0 * (2**attempt))
-            attempt += 1
-        except Exception as e:
-            print("Unexpected generation error:", e)
-            return "I'm having trouble generating an answer right now. Please try again later."
-
-
-def ask_mental(user_msg: str, sentiment: dict, model_name: str | None = None) -> tuple[str, bool]:
-    """
-    Generate an empathetic mental-health response.
-    Returns: (reply_text, is_crisis)
+            model = _get_model(attempt.name, system)
+            while True:
+                try:
+                    resp = await asyncio.wait_for(model.generate_content_async(prompt), timeout=route.remaining())
+                    text = getattr(resp, "text", str(resp)).strip()
+                except asyncio.TimeoutError:
+                    attempt.timed_out()
+                    return TRANSIENT_MESSAGE
+                except route.errors as e:
+                    delay = attempt.failed(e)
+                    if delay is None:
+                        break
+                    await asyncio.sleep(delay)
+                    continue
+                except Exception as e:
+                    print("Unexpected generation error:", e)
+                    return ERROR_MESSAGE
+                attempt.succeeded()
+                return text
+        finally:
+            attempt.release()  # also on cancellation, e.g. a hedge that lost the race
+    return route.failure
+
+
+async def _stream_safe_async(model_name: str, prompt: str, system: str = "", retries: int = 2):
     """
-    model_to_use = model_name or DEFAULT_MODEL
+    Yield text chunks as the model produces them. Until the first chunk is sent, errors
+    are handled like _generate_safe (retries, fallback chain, breakers); after that a
+    failure simply ends the stream.
+    """
+    route = _Route(model_name, retries)
+    emitted = False
+    for attempt in route.attempts():
+        try:
+            model = _get_model(attempt.name, system)
+            while True:
+                try:
+                    response = await model.generate_content_async(prompt, stream=True)
+                    async for chunk in response:
+                        try:
+                            text = chunk.text
+                        except ValueError:
+                            continue  # chunk without text parts (e.g. finish metadata)
+                        if text:
+                            emitted = True
+                            yield text
+                except route.errors as e:
+                    delay = attempt.failed(e, can_retry=not emitted)
+                    if emitted:
+                        return
+                    if delay is None:
+                        break
+                    await asyncio.sleep(delay)
+                    continue
+                except Exception as e:
+                    print("Unexpected generation error:", e)
+                    if not emitted:
+                        yield ERROR_MESSAGE
+                    return
+                attempt.succeeded()
+                return
+        finally:
+            attempt.release()  # the client may close the stream mid-answer
+    yield route.failure
 
-    # Check for crisis first
-    crisis = detect_crisis(user_msg)
-    if crisis:
-        return CRISIS_RESPONSE, True
 
+def _history_block(history: str | None) -> str:
+    return f"{history}\n\n" if history else ""
+
+
+def _mental_prompt(user_msg: str, sentiment: dict, history: str | None = None) -> str:
     sentiment_label = (sentiment or {}).get("label", "neutral")
     sentiment_score = (sentiment or {}).get("score", 0.0)
 
-    system = (
-        "You are a warm, empathetic mental health companion. "
-        "You do NOT provide medical diagnoses or prescription advice. "
-        "If the user expresses suicidal ideation or self-harm intent, "
-        "provide crisis hotline numbers immediately. "
-        "Keep responses focused, compassionate, and under 150 words unless detail is truly needed."
-    )
-
-    prompt = (
+    return (
+        f"{_history_block(history)}"
         f"Detected emotional tone: {sentiment_label} (confidence: {sentiment_score:.2f})\n\n"
         f"User message: {user_msg}\n\n"
         "Respond compassionately in 3-5 sentences. "
@@ -107,39 +384,109 @@ def ask_mental(user_msg: str, sentiment: dict, model_name: str | None = None) ->
         "and end with an open question to keep them talking."
     )
 
-    return _generate_safe(model_to_use, prompt, system=system), False
+
+def _legal_prompt(user_msg: str, retrieved_passages: list, history: str | None = None) -> str:
+    context, packed, context_tokens = context_packer.pack_context(retrieved_passages)
+
+    prompt = (
+        f"{'Context from knowledge base:' + chr(10) + context if context else 'No documents provided.'}\n\n"
+        f"{_history_block(history)}"
+        f"User question: {user_msg}\n\n"
+        "Answer clearly in 3-6 sentences. "
+        "If you used a source from context, cite it like [Source: filename]. "
+        "Use plain language and structure your answer logically."
+    )
+    tokens = context_packer.record(prompt, context_tokens, len(retrieved_passages), len(packed))
+    print(f"Legal prompt: ~{tokens} input tokens ({len(packed)} context blocks from {len(retrieved_passages)} passages)")
+    return prompt
+
+
+def ask_mental(
+    user_msg: str, sentiment: dict, model_name: str | None = None, history: str | None = None
+) -> tuple[str, bool]:
+    """
+    Generate an empathetic mental-health response. `history` is the bounded
+    conversation context (rolling summary plus recent turns), if any.
+    Returns: (reply_text, is_crisis)
+    """
+    model_to_use = model_name or DEFAULT_MODEL
+
+    # Check for crisis first
+    crisis = detect_crisis(user_msg)
+    if crisis:
+        return CRISIS_RESPONSE, True
+
+    prompt = _mental_prompt(user_msg, sentiment, history)
+    return _generate_safe(model_to_use, prompt, system=MENTAL_SYSTEM), False
+
+
+async def ask_mental_async(
+    user_msg: str, sentiment: dict, model_name: str | None = None, history: str | None = None
+) -> tuple[str, bool]:
+    """Async variant of ask_mental for the event-loop chat path."""
+    model_to_use = model_name or DEFAULT_MODEL
+
+    if detect_crisis(user_msg):
+        return CRISIS_RESPONSE, True
+
+    prompt = _mental_prompt(user_msg, sentiment, history)
+    return await _generate_safe_async(model_to_use, prompt, system=MENTAL_SYSTEM), False
+
+
+async def _single_chunk(text: str):
+    yield text
+
+
+def ask_mental_stream(user_msg: str, sentiment: dict, model_name: str | None = None, history: str | None = None):
+    """
+    Streaming variant of ask_mental.
+    Returns: (async iterator of reply text chunks, is_crisis)
+    """
+    model_to_use = model_name or DEFAULT_MODEL
+
+    if detect_crisis(user_msg):
+        return _single_chunk(CRISIS_RESPONSE), True
+
+    prompt = _mental_prompt(user_msg, sentiment, history)
+    return _stream_safe_async(model_to_use, prompt, system=MENTAL_SYSTEM), False
 
 
 def ask_legal(
-    user_msg: str, retrieved_passages=None, model_name: str | None = None
+    user_msg: str, retrieved_passages=None, model_name: str | None = None, history: str | None = None
 ) -> tuple[str, list]:
     """
     Answer legal information questions using optional retrieved passages.
-    Returns: (answer_text, retrieved_passages)
+    Returns: (answer_text, retrieved_passages with text shortened to a preview)
     """
     model_to_use = model_name or DEFAULT_MODEL
     retrieved_passages = retrieved_passages or []
 
-    context = ""
-    for r in retrieved_passages[:5]:
-        src = r.get("source", "unknown")
-        txt = r.get("text", "")
-        context += f"[{src}] {txt[:800]}\n\n"
-
-    system = (
-        "You are a legal information assistant. "
-        "You provide general legal information only — never legal advice. "
-        "Always end with the disclaimer: *This is general information, not legal advice. "
-        "Consult a qualified lawyer for your specific situation.*"
-    )
+    prompt = _legal_prompt(user_msg, retrieved_passages, history)
+    answer = _generate_safe(model_to_use, prompt, system=LEGAL_SYSTEM)
+    return answer, context_packer.source_refs(retrieved_passages)
 
-    prompt = (
-        f"{'Context from knowledge base:' + chr(10) + context if context else 'No documents provided.'}\n\n"
-        f"User question: {user_msg}\n\n"
-        "Answer clearly in 3-6 sentences. "
-        "If you used a source from context, cite it like [Source: filename]. "
-        "Use plain language and structure your answer logically."
-    )
 
-    answer = _generate_safe(model_to_use, prompt, system=system)
-    return answer, retrieved_passages
\ No newline at end of file
+async def ask_legal_async(
+    user_msg: str, retrieved_passages=None, model_name: str | None = None, history: str | None = None
+) -> tuple[str, list]:
+    """Async variant of ask_legal for the event-loop chat path."""
+    model_to_use = model_name or DEFAULT_MODEL
+    retrieved_passages = retrieved_passages or []
+
+    prompt = _legal_prompt(user_msg, retrieved_passages, history)
+    answer = await _generate_safe_async(model_to_use, prompt, system=LEGAL_SYSTEM)
+    return answer, context_packer.source_refs(retrieved_passages)
+
+
+def ask_legal_stream(
+    user_msg: str, retrieved_passages=None, model_name: str | None = None, history: str | None = None
+):
+    """
+    Streaming variant of ask_legal.
+    Returns: (async iterator of answer text chunks, retrieved_passages)
+    """
+    model_to_use = model_name or DEFAULT_MODEL
+    retrieved_passages = retrieved_passages or []
+
+    prompt = _legal_prompt(user_msg, retrieved_passages, history)
+    return _stream_safe_async(model_to_use, prompt, system=LEGAL_SYSTEM), context_packer.source_refs(retrieved_passages)
@@ -1,37 +1,79 @@
 import hashlib
-import hmac
+import json
 import logging
 import os
 import re
 import secrets
 import time
 import traceback
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Literal, Optional
+from typing import Any, Dict, List, Literal, Optional, Tuple
 
 import jwt
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, File, HTTPException, Header, Request, UploadFile
+from fastapi import BackgroundTasks, Depends, FastAPI, File, HTTPException, Header, Query, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, validator
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
 
 load_dotenv()
 
-from app.api_client import ask_legal, ask_mental
-from app.db import AuthUser, Conversation, Message, RateLimit, SessionLocal, User, init_db, ping_db
-from app.sentiment import analyze_sentiment
+from app.admission import Overloaded, limiter_for, stats as admission_stats
+from app.answer_cache import LEGAL_CACHE_ENABLED, legal_answer_cache
+from app.api_client import (
+    FALLBACK_MESSAGES,
+    ask_legal_async,
+    ask_legal_stream,
+    ask_mental_async,
+    ask_mental_stream,
+    warm_models,
+)
+from app.cache import LRUCache
+from app.context_packer import stats as legal_context_stats
+from app.conversation_memory import load_history, refresh_summary
+from app.db import AuthUser, Conversation, Message, SessionLocal, User, init_db, ping_db, touch_conversation
+from app.hedging import hedger
+from app.model_router import router as model_router
+from app.passwords import (
+    hash_password,
+    hash_password_async,
+    shutdown as shutdown_passwords,
+    stats as password_stats,
+    verify_password,
+    verify_password_async,
+)
+from app.process_pool import WorkerPoolError
+from app.rate_limit import DatabaseRateLimiter, make_rate_limiter
+from app.sentiment import (
+    analyze_sentiment,
+    readiness as sentiment_readiness,
+    shutdown as shutdown_sentiment,
+    start_warmup as start_sentiment_warmup,
+    stats as sentiment_stats,
+)
+from app.singleflight import stats as coalescing_stats
+from app.write_behind import MESSAGE_WRITE_BEHIND, message_writer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 try:
-    from app.retrieval import ingest_folder, query as kb_query
+    from app.retrieval import embed_query, index_version as kb_index_version
+    from app.retrieval import ingest_files, ingest_folder, query as kb_query
     HAS_RETRIEVAL = True
 except Exception as e:
     logger.warning(f"Retrieval not available: {e}")
+    embed_query = None
+    kb_index_version = None
+    ingest_files = None
     ingest_folder = None
     kb_query = None
     HAS_RETRIEVAL = False
@@ -48,10 +90,14 @@ FRONTEND_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "fronten
 JWT_SECRET = os.getenv("JWT_SECRET", secrets.token_hex(32))
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRE_HOURS = int(os.getenv("JWT_EXPIRE_HOURS", "24"))
-RATE_LIMIT_MAX = int(os.getenv("RATE_LIMIT_MAX", "30"))
-RATE_LIMIT_WINDOW_MINUTES = int(os.getenv("RATE_LIMIT_WINDOW_MINUTES", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "4096"))
+AUTH_CACHE_TTL_S = float(os.getenv("AUTH_CACHE_TTL_S", "60"))
 MAX_MESSAGE_LENGTH = int(os.getenv("MAX_MESSAGE_LENGTH", "2000"))
+SENTIMENT_WARMUP = os.getenv("SENTIMENT_WARMUP", "true").lower() not in {"0", "false", "no"}
 MAX_FILE_SIZE_MB = int(os.getenv("MAX_FILE_SIZE_MB", "10"))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_KB", "256")) * 1024
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "200"))
 
 os.makedirs(KB_FOLDER, exist_ok=True)
 
@@ -62,7 +108,22 @@ except Exception as e:
     logger.error(f"Database init failed: {e}")
     raise
 
-app = FastAPI(title="AI Assistant API", version="2.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Model warmup runs in a daemon thread so the port binds immediately;
+    # /api/health reports readiness separately from liveness.
+    if SENTIMENT_WARMUP:
+        start_sentiment_warmup()
+    warm_models(SELECTED_MODEL)
+    yield
+    if not message_writer.close():
+        logger.error("Shutdown with chat messages still queued for writing")
+    shutdown_sentiment()
+    shutdown_passwords()
+
+
+app = FastAPI(title="AI Assistant API", version="2.0.0", lifespan=lifespan)
 
 # ─── Global exception handlers — always return JSON ──────────────────────────
 
@@ -82,7 +143,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
-    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail}, headers=exc.headers)
 
 app.add_middleware(
     CORSMiddleware,
@@ -146,25 +207,30 @@ def normalize_phone(phone: str) -> str:
     return re.sub(r"\D", "", phone or "")
 
 
-def hash_password(password: str, salt: str) -> str:
-    raw = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt.encode("utf-8"), 120000)
-    return raw.hex()
+def credential_stamp(password_salt: str) -> str:
+    """Short fingerprint of the user's credentials; changes whenever the password is reset."""
+    return hashlib.sha256(password_salt.encode("utf-8")).hexdigest()[:16]
 
 
-def verify_password(password: str, salt: str, expected_hash: str) -> bool:
-    return hmac.compare_digest(hash_password(password, salt), expected_hash)
-
-
-def create_token(user_id: int, email: str) -> str:
+def create_token(user_id: int, email: str, full_name: Optional[str] = None, stamp: Optional[str] = None) -> str:
     payload = {
         "sub": str(user_id),
         "email": email,
         "exp": datetime.utcnow() + timedelta(hours=JWT_EXPIRE_HOURS),
         "iat": datetime.utcnow(),
     }
+    # Claims used downstream, so authenticated requests need no user-row load.
+    if full_name is not None:
+        payload["name"] = full_name
+    if stamp is not None:
+        payload["stamp"] = stamp
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 
+def _token_for(user: AuthUser) -> str:
+    return create_token(user.id, user.email, user.full_name, credential_stamp(user.password_salt))
+
+
 def decode_token(token: str) -> dict:
     try:
         return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
@@ -174,39 +240,77 @@ def decode_token(token: str) -> dict:
         raise HTTPException(status_code=401, detail="Invalid token.")
 
 
-def get_current_user(authorization: Optional[str] = Header(None)) -> AuthUser:
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Authorization header missing or invalid.")
-    token = authorization.split(" ", 1)[1]
-    payload = decode_token(token)
-    user_id = int(payload["sub"])
+@dataclass(frozen=True)
+class AuthPrincipal:
+    """The authenticated caller, as needed by the routes (no ORM session attached)."""
+    id: int
+    full_name: str
+    email: str
+    stamp: str
+    user_id: Optional[int] = None  # users.id, which owns the caller's conversations
+
+
+# Active users by id; a hit authenticates a request without touching the database.
+_auth_cache = LRUCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL_S)
+
+
+def invalidate_user(user_id: int) -> None:
+    """Drop a cached user after a password reset or deactivation."""
+    _auth_cache.pop(user_id)
+
+
+def _load_principal(user_id: int) -> Optional[AuthPrincipal]:
+    cached = _auth_cache.get(user_id)
+    if cached is not None:
+        return cached
     db = SessionLocal()
     try:
-        user = db.query(AuthUser).filter(AuthUser.id == user_id, AuthUser.is_active == True).first()
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found or inactive.")
-        return user
+        row = (
+            db.query(AuthUser.id, AuthUser.full_name, AuthUser.email, AuthUser.password_salt, AuthUser.user_id)
+            .filter(AuthUser.id == user_id, AuthUser.is_active == True)
+            .first()
+        )
     finally:
         db.close()
+    if not row:
+        return None
+    principal = AuthPrincipal(row.id, row.full_name, row.email, credential_stamp(row.password_salt), row.user_id)
+    _auth_cache.set(user_id, principal)
+    return principal
 
 
-def check_rate_limit(user_id: int, db) -> None:
-    window_start = datetime.utcnow() - timedelta(minutes=RATE_LIMIT_WINDOW_MINUTES)
-    rl = db.query(RateLimit).filter(RateLimit.auth_user_id == user_id).first()
-    if not rl:
-        db.add(RateLimit(auth_user_id=user_id, window_start=datetime.utcnow(), request_count=1))
-        db.commit()
-        return
-    if rl.window_start < window_start:
-        rl.window_start = datetime.utcnow()
-        rl.request_count = 1
-        db.commit()
-        return
-    if rl.request_count >= RATE_LIMIT_MAX:
-        reset_in = int((rl.window_start + timedelta(minutes=RATE_LIMIT_WINDOW_MINUTES) - datetime.utcnow()).total_seconds() / 60)
-        raise HTTPException(status_code=429, detail=f"Rate limit exceeded. Try again in ~{reset_in} minute(s).")
-    rl.request_count += 1
-    db.commit()
+def get_current_user(authorization: Optional[str] = Header(None)) -> AuthPrincipal:
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Authorization header missing or invalid.")
+    token = authorization.split(" ", 1)[1]
+    payload = decode_token(token)
+    user = _load_principal(int(payload["sub"]))
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found or inactive.")
+    if "stamp" in payload and payload["stamp"] != user.stamp:
+        # The cached principal may predate a password reset the token was issued after
+        # (another worker, or before invalidate_user ran here): check the database once.
+        invalidate_user(user.id)
+        user = _load_principal(user.id)
+        if not user or payload["stamp"] != user.stamp:
+            raise HTTPException(status_code=401, detail="Session expired. Please log in again.")
+    if "name" in payload:
+        return AuthPrincipal(user.id, payload["name"], payload.get("email", user.email), user.stamp, user.user_id)
+    return user
+
+
+rate_limiter = make_rate_limiter()
+
+
+def check_rate_limit(user_id: int, db=None) -> None:
+    """Count one chat message; `db` is only used by the shared (RATE_LIMIT_BACKEND=db) backend."""
+    allowed, retry_after = rate_limiter.hit(user_id, db)
+    if not allowed:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Rate limit exceeded. Try again in ~{max(1, round(retry_after / 60))} minute(s).",
+            headers={"Retry-After": str(retry_after)},
+        )
 
 
 # ─── Routes ───────────────────────────────────────────────────────────────────
@@ -216,12 +320,29 @@ def health() -> Dict[str, Any]:
     return {
         "ok": True,
         "db": ping_db(),
+        "sentiment": sentiment_readiness(),
         "retrieval_enabled": HAS_RETRIEVAL,
         "rewards_enabled": HAS_REWARDS,
         "version": "2.0.0",
     }
 
 
+@app.get("/api/metrics")
+def metrics() -> Dict[str, Any]:
+    return {
+        "sentiment": sentiment_stats(),
+        "legal_cache": legal_answer_cache.stats(),
+        "coalescing": coalescing_stats(),
+        "routing": model_router.stats(),
+        "hedging": hedger.stats(),
+        "legal_context": legal_context_stats(),
+        "admission": admission_stats(),
+        "passwords": password_stats(),
+        "auth_cache": _auth_cache.stats(),
+        "write_behind": message_writer.stats(),
+    }
+
+
 @app.post("/api/db-init")
 def db_init_route() -> Dict[str, Any]:
     """Force-create all tables. Safe to call multiple times."""
@@ -232,8 +353,27 @@ def db_init_route() -> Dict[str, Any]:
         raise HTTPException(status_code=500, detail=f"DB init failed: {str(e)}")
 
 
+async def _password_work(fn, *args):
+    """Hash or verify in the password pool; a saturated or failed pool becomes a 503."""
+    try:
+        return await fn(*args)
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many sign-in requests right now. Please try again shortly.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except WorkerPoolError:
+        logger.error(f"Password worker failed: {traceback.format_exc()}")
+        raise HTTPException(
+            status_code=503,
+            detail="Sign-in is temporarily unavailable. Please try again.",
+            headers={"Retry-After": "1"},
+        )
+
+
 @app.post("/api/auth/register")
-def register(req: RegisterRequest) -> Dict[str, Any]:
+async def register(req: RegisterRequest) -> Dict[str, Any]:
     full_name = (req.full_name or "").strip()
     email = (req.email or "").strip().lower()
     phone = normalize_phone(req.phone)
@@ -248,6 +388,12 @@ def register(req: RegisterRequest) -> Dict[str, Any]:
     if len(password) < 8:
         raise HTTPException(status_code=400, detail="Password must be at least 8 characters.")
 
+    salt = secrets.token_hex(16)
+    password_hash = await _password_work(hash_password_async, password, salt)
+    return await run_in_threadpool(_create_account, full_name, email, phone, password_hash, salt)
+
+
+def _create_account(full_name: str, email: str, phone: str, password_hash: str, salt: str) -> Dict[str, Any]:
     db = SessionLocal()
     try:
         if db.query(AuthUser).filter(AuthUser.email == email).first():
@@ -255,19 +401,19 @@ def register(req: RegisterRequest) -> Dict[str, Any]:
         if db.query(AuthUser).filter(AuthUser.phone == phone).first():
             raise HTTPException(status_code=409, detail="Phone number is already registered.")
 
-        salt = secrets.token_hex(16)
         user = AuthUser(
             full_name=full_name,
             phone=phone,
             email=email,
-            password_hash=hash_password(password, salt),
+            password_hash=password_hash,
             password_salt=salt,
+            user=_owner_row(db, email),
         )
         db.add(user)
         db.commit()
         db.refresh(user)
 
-        token = create_token(user.id, user.email)
+        token = _token_for(user)
         logger.info(f"New user registered: {email}")
         return {
             "ok": True,
@@ -289,25 +435,34 @@ def register(req: RegisterRequest) -> Dict[str, Any]:
         db.close()
 
 
+def _find_account(identifier: str) -> Optional[AuthUser]:
+    """The account for an email or phone number, detached from its session."""
+    db = SessionLocal()
+    try:
+        user = db.query(AuthUser).filter(AuthUser.email == identifier).first()
+        if not user:
+            phone = normalize_phone(identifier)
+            user = db.query(AuthUser).filter(AuthUser.phone == phone).first()
+        return user
+    finally:
+        db.close()
+
+
 @app.post("/api/auth/login")
-def login(req: LoginRequest) -> Dict[str, Any]:
+async def login(req: LoginRequest) -> Dict[str, Any]:
     identifier = (req.identifier or "").strip().lower()
     password = req.password or ""
     if not identifier or not password:
         raise HTTPException(status_code=400, detail="Identifier and password are required.")
 
-    db = SessionLocal()
     try:
-        user = db.query(AuthUser).filter(AuthUser.email == identifier).first()
-        if not user:
-            phone = normalize_phone(identifier)
-            user = db.query(AuthUser).filter(AuthUser.phone == phone).first()
-        if not user or not verify_password(password, user.password_salt, user.password_hash):
+        user = await run_in_threadpool(_find_account, identifier)
+        if not user or not await _password_work(verify_password_async, password, user.password_salt, user.password_hash):
             raise HTTPException(status_code=401, detail="Invalid credentials.")
         if not user.is_active:
             raise HTTPException(status_code=403, detail="Account is deactivated.")
 
-        token = create_token(user.id, user.email)
+        token = _token_for(user)
         return {
             "ok": True,
             "token": token,
@@ -323,12 +478,10 @@ def login(req: LoginRequest) -> Dict[str, Any]:
     except Exception as e:
         logger.error(f"Login error: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"Login failed: {str(e)}")
-    finally:
-        db.close()
 
 
 @app.post("/api/auth/forgot-password")
-def forgot_password(req: ForgotPasswordRequest) -> Dict[str, Any]:
+async def forgot_password(req: ForgotPasswordRequest) -> Dict[str, Any]:
     email = (req.email or "").strip().lower()
     phone = normalize_phone(req.phone)
     new_password = req.new_password or ""
@@ -341,15 +494,33 @@ def forgot_password(req: ForgotPasswordRequest) -> Dict[str, Any]:
     if new_password != confirm:
         raise HTTPException(status_code=400, detail="Passwords do not match.")
 
+    user_id = await run_in_threadpool(_find_reset_account, email, phone)
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="No user found with the provided email and phone.")
+    salt = secrets.token_hex(16)
+    password_hash = await _password_work(hash_password_async, new_password, salt)
+    return await run_in_threadpool(_store_password, user_id, password_hash, salt)
+
+
+def _find_reset_account(email: str, phone: str) -> Optional[int]:
+    db = SessionLocal()
+    try:
+        row = db.query(AuthUser.id).filter(AuthUser.email == email, AuthUser.phone == phone).first()
+        return row.id if row else None
+    finally:
+        db.close()
+
+
+def _store_password(user_id: int, password_hash: str, salt: str) -> Dict[str, Any]:
     db = SessionLocal()
     try:
-        user = db.query(AuthUser).filter(AuthUser.email == email, AuthUser.phone == phone).first()
+        user = db.query(AuthUser).filter(AuthUser.id == user_id).first()
         if not user:
             raise HTTPException(status_code=404, detail="No user found with the provided email and phone.")
-        salt = secrets.token_hex(16)
         user.password_salt = salt
-        user.password_hash = hash_password(new_password, salt)
+        user.password_hash = password_hash
         db.commit()
+        invalidate_user(user.id)  # tokens issued before the reset stop working
         return {"ok": True, "message": "Password reset successful."}
     except HTTPException:
         raise
@@ -360,80 +531,132 @@ def forgot_password(req: ForgotPasswordRequest) -> Dict[str, Any]:
         db.close()
 
 
-@app.post("/api/chat", response_model=ChatResponse)
-def chat(req: ChatRequest, current_user: AuthUser = Depends(get_current_user)) -> ChatResponse:
-    db = SessionLocal()
-    try:
-        check_rate_limit(current_user.id, db)
+GENERATION_FALLBACK_REPLY = "Sorry, I could not generate a response right now. Please try again."
 
-        user = db.query(User).filter(User.username == current_user.full_name).first()
-        if not user:
-            user = User(username=current_user.full_name, email=current_user.email)
-            db.add(user)
-            db.commit()
-            db.refresh(user)
-
-        conv = None
-        if req.conversation_id:
-            conv = db.query(Conversation).filter(
-                Conversation.id == req.conversation_id,
-                Conversation.user_id == user.id,
-            ).first()
 
-        if not conv:
-            conv = Conversation(
-                user_id=user.id,
-                section=req.mode,
-                title=req.message[:60] + ("..." if len(req.message) > 60 else ""),
-            )
-            db.add(conv)
-            db.commit()
-            db.refresh(conv)
+def _owner_row(db, email: str) -> User:
+    """The users row for a new account: an unlinked one with the same email, or a fresh one."""
+    owner = (
+        db.query(User)
+        .filter(User.email == email, ~User.id.in_(db.query(AuthUser.user_id).filter(AuthUser.user_id.isnot(None))))
+        .first()
+    )
+    return owner or User(email=email)
 
-        db.add(Message(conversation_id=conv.id, sender="user", text=req.message, sentiment=None))
+
+def _owner_id(db, current_user: AuthPrincipal) -> int:
+    """users.id for the caller, linking a users row if the account has none yet."""
+    if current_user.user_id is not None:
+        return current_user.user_id
+    account = db.query(AuthUser).filter(AuthUser.id == current_user.id).one()
+    if account.user_id is not None:
+        return account.user_id
+    try:
+        with db.begin_nested():
+            account.user = _owner_row(db, account.email)
+    except IntegrityError:
+        # A concurrent first turn linked (and committed) the account's users row first.
+        pass
+    return db.query(AuthUser.user_id).filter(AuthUser.id == current_user.id).scalar()
+
+
+def _start_turn(db, req: ChatRequest, current_user: AuthPrincipal) -> Tuple[Conversation, str]:
+    """
+    Rate-limit the user, resolve or create the conversation, load its history and store
+    the user message, committing all of it at most once.
+    Returns the conversation and its bounded history for the prompt.
+    """
+    check_rate_limit(current_user.id, db)
+    changed = isinstance(rate_limiter, DatabaseRateLimiter)
+
+    owner_id = current_user.user_id
+    linked = owner_id is None
+    if linked:
+        owner_id = _owner_id(db, current_user)
+        changed = True
+
+    conv = None
+    if req.conversation_id:
+        conv = db.query(Conversation).filter(
+            Conversation.id == req.conversation_id,
+            Conversation.user_id == owner_id,
+        ).first()
+
+    if not conv:
+        conv = Conversation(
+            user_id=owner_id,
+            section=req.mode,
+            title=req.message[:60] + ("..." if len(req.message) > 60 else ""),
+        )
+        db.add(conv)
+        db.flush()
+        changed = True
+
+    if MESSAGE_WRITE_BEHIND:
+        history = load_history(db, conv, message_writer.pending(conv.id))
+        message_writer.enqueue(conv.id, "user", req.message)
+    else:
+        history = load_history(db, conv)
+        now = datetime.utcnow()
+        db.add(Message(conversation_id=conv.id, sender="user", text=req.message, sentiment=None, created_at=now))
+        touch_conversation(db, conv.id, req.message, now)
+        changed = True
+    if changed:
         db.commit()
+    if linked:
+        invalidate_user(current_user.id)  # only once the link is visible to the next load
+    return conv, history
 
-        sentiment = None
-        if req.mode == "mental":
-            try:
-                sentiment = analyze_sentiment(req.message)
-            except Exception:
-                sentiment = None
 
-        sources: List[Dict[str, Any]] = []
-        is_crisis = False
-        try:
-            if req.mode == "mental":
-                reply, is_crisis = ask_mental(req.message, sentiment, model_name=SELECTED_MODEL)
-            else:
-                retrieved = []
-                if kb_query:
-                    try:
-                        retrieved = kb_query(req.message, k=5)
-                    except Exception:
-                        retrieved = []
-                reply, sources = ask_legal(req.message, retrieved_passages=retrieved, model_name=SELECTED_MODEL)
-        except Exception as e:
-            logger.error(f"Generation error: {traceback.format_exc()}")
-            reply = "Sorry, I could not generate a response right now. Please try again."
-            sources = []
+def _turn_sentiment(req: ChatRequest) -> Optional[Dict[str, Any]]:
+    if req.mode != "mental":
+        return None
+    try:
+        return analyze_sentiment(req.message)
+    except Exception:
+        return None
 
-        db.add(Message(
-            conversation_id=conv.id,
-            sender="bot",
-            text=reply,
-            sentiment=sentiment if req.mode == "mental" else None,
-            is_crisis=is_crisis,
-        ))
-        db.commit()
 
-        return ChatResponse(
-            conversation_id=conv.id,
-            reply=reply,
-            sentiment=sentiment,
-            sources=sources,
-            is_crisis=is_crisis,
-        )
+def _retrieve(message: str, q_vec=None) -> List[Dict[str, Any]]:
+    if not kb_query:
+        return []
+    try:
+        return kb_query(message, k=5, q_vec=q_vec)
+    except Exception:
+        return []
+
+
+def _probe_legal_cache(message: str, cacheable: bool = True):
+    """
+    Embed the question once and look it up in the semantic answer cache.
+    Returns (q_vec, kb_version, hit); the vector is reused for retrieval on a miss.
+    With `cacheable` false (the turn has conversation history) nothing is looked up.
+    """
+    if not (LEGAL_CACHE_ENABLED and embed_query):
+        return None, None, None
+    try:
+        q_vec = embed_query(message)
+        version = kb_index_version()
+    except Exception as e:
+        logger.warning(f"Legal answer cache skipped: {e}")
+        return None, None, None
+    return q_vec, version, legal_answer_cache.lookup(q_vec, version) if cacheable else None
+
+
+def _remember_legal_answer(q_vec, version, reply: str, sources: List[Dict[str, Any]]) -> None:
+    if q_vec is not None and reply not in FALLBACK_MESSAGES:
+        legal_answer_cache.store(q_vec, version, reply, sources)
+
+
+def _open_turn(req: ChatRequest, current_user: AuthPrincipal) -> Tuple[int, str]:
+    """
+    Blocking DB part of a turn start; run it in the threadpool.
+    Returns the conversation id and its bounded history for the prompt.
+    """
+    db = SessionLocal()
+    try:
+        conv, history = _start_turn(db, req, current_user)
+        return conv.id, history
     except HTTPException:
         raise
     except Exception as e:
@@ -444,19 +667,279 @@ def chat(req: ChatRequest, current_user: AuthUser = Depends(get_current_user)) -
         db.close()
 
 
+def _save_bot_message(conv_id: int, mode: str, reply: str, sentiment, is_crisis: bool) -> Optional[int]:
+    """Store the reply; with write-behind it is queued and no id is known yet."""
+    if MESSAGE_WRITE_BEHIND:
+        message_writer.enqueue(conv_id, "bot", reply, sentiment if mode == "mental" else None, is_crisis)
+        return None
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        msg = Message(
+            conversation_id=conv_id,
+            sender="bot",
+            text=reply,
+            sentiment=sentiment if mode == "mental" else None,
+            is_crisis=is_crisis,
+            created_at=now,
+        )
+        db.add(msg)
+        touch_conversation(db, conv_id, reply, now)
+        db.commit()
+        return msg.id
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def _admit_chat() -> float:
+    """Take a generation slot for the chat model, or shed the request with 503 + Retry-After."""
+    try:
+        return await limiter_for(SELECTED_MODEL).acquire()
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=503,
+            detail="The assistant is busy right now. Please try again shortly.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
+def _release_chat(started: float, reply: Optional[str]) -> None:
+    """
+    Free the chat slot. Any failure reply (quota, transient, error) or a chain whose
+    breakers are all open is congestion; a turn that never got a reply (rate limited,
+    failed before generating, client gone) releases the slot without a sample.
+    """
+    limiter = limiter_for(SELECTED_MODEL)
+    if reply is None:
+        limiter.release(started, measured=False)
+        return
+    congested = reply in FALLBACK_MESSAGES or reply == GENERATION_FALLBACK_REPLY or model_router.exhausted(SELECTED_MODEL)
+    limiter.release(started, congested=congested)
+
+
+@app.post("/api/chat", response_model=ChatResponse)
+async def chat(
+    req: ChatRequest,
+    background_tasks: BackgroundTasks,
+    current_user: AuthPrincipal = Depends(get_current_user),
+) -> ChatResponse:
+    # Admission happens before any DB work, so shed requests cost next to nothing.
+    started = await _admit_chat()
+    response = None
+    try:
+        response = await _chat_turn(req, background_tasks, current_user)
+        return response
+    finally:
+        _release_chat(started, response.reply if response else None)
+
+
+async def _chat_turn(req: ChatRequest, background_tasks: BackgroundTasks, current_user: AuthPrincipal) -> ChatResponse:
+    # Runs on the event loop: generation is awaited, and the blocking DB, sentiment and
+    # retrieval steps are offloaded explicitly, so slow LLM calls do not hold threads.
+    conv_id, history = await run_in_threadpool(_open_turn, req, current_user)
+    sentiment = await run_in_threadpool(_turn_sentiment, req)
+
+    sources: List[Dict[str, Any]] = []
+    is_crisis = False
+    try:
+        if req.mode == "mental":
+            reply, is_crisis = await ask_mental_async(req.message, sentiment, model_name=SELECTED_MODEL, history=history)
+        else:
+            # The cache is keyed on the question alone: a reply shaped by this user's own
+            # history must neither be served from it nor stored in it.
+            cacheable = not history
+            q_vec, kb_version, hit = await run_in_threadpool(_probe_legal_cache, req.message, cacheable)
+            if hit:
+                reply, sources = hit["answer"], hit["sources"]
+            else:
+                retrieved = await run_in_threadpool(_retrieve, req.message, q_vec)
+                reply, sources = await ask_legal_async(
+                    req.message, retrieved_passages=retrieved, model_name=SELECTED_MODEL, history=history
+                )
+                if cacheable:
+                    _remember_legal_answer(q_vec, kb_version, reply, sources)
+    except Exception as e:
+        logger.error(f"Generation error: {traceback.format_exc()}")
+        reply = GENERATION_FALLBACK_REPLY
+        sources = []
+
+    try:
+        await run_in_threadpool(_save_bot_message, conv_id, req.mode, reply, sentiment, is_crisis)
+    except Exception as e:
+        logger.error(f"Chat error: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
+
+    # Fold older turns into the conversation summary after the response is sent.
+    background_tasks.add_task(refresh_summary, conv_id, SELECTED_MODEL)
+    return ChatResponse(
+        conversation_id=conv_id,
+        reply=reply,
+        sentiment=sentiment,
+        sources=sources,
+        is_crisis=is_crisis,
+    )
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _replay(text: str):
+    yield text
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(req: ChatRequest, current_user: AuthPrincipal = Depends(get_current_user)) -> StreamingResponse:
+    """
+    Server-Sent Events variant of /api/chat. Emits one `meta` event (conversation id,
+    sentiment, sources), a `token` event per generated chunk, and a final `done` event
+    once the complete bot message has been stored.
+    """
+    started = await _admit_chat()
+    outcome: Dict[str, Any] = {"reply": None, "released": False, "parts": [], "saved": False}
+
+    def release() -> None:
+        if not outcome["released"]:
+            outcome["released"] = True
+            _release_chat(started, outcome["reply"])
+
+    try:
+        conv_id, history = await run_in_threadpool(_open_turn, req, current_user)
+        sentiment = await run_in_threadpool(_turn_sentiment, req)
+    except BaseException:
+        release()
+        raise
+
+    sources: List[Dict[str, Any]] = []
+    is_crisis = False
+    q_vec = kb_version = None
+    cacheable = False
+    try:
+        if req.mode == "mental":
+            chunks, is_crisis = ask_mental_stream(req.message, sentiment, model_name=SELECTED_MODEL, history=history)
+        else:
+            cacheable = not history  # see _chat_turn
+            q_vec, kb_version, hit = await run_in_threadpool(_probe_legal_cache, req.message, cacheable)
+            if hit:
+                chunks, sources = _replay(hit["answer"]), hit["sources"]
+                cacheable = False  # already cached
+            else:
+                retrieved = await run_in_threadpool(_retrieve, req.message, q_vec)
+                chunks, sources = ask_legal_stream(
+                    req.message, retrieved_passages=retrieved, model_name=SELECTED_MODEL, history=history
+                )
+    except Exception:
+        logger.error(f"Generation error: {traceback.format_exc()}")
+        chunks = None
+
+    async def events():
+        yield _sse("meta", {
+            "conversation_id": conv_id,
+            "sentiment": sentiment,
+            "sources": sources,
+            "is_crisis": is_crisis,
+        })
+        parts: List[str] = outcome["parts"]
+        try:
+            if chunks is not None:
+                async for text in chunks:
+                    parts.append(text)
+                    yield _sse("token", {"text": text})
+        except Exception:
+            logger.error(f"Generation error: {traceback.format_exc()}")
+        except BaseException:
+            release()  # the client went away mid-reply: no sample for the limiter
+            raise
+        streamed = "".join(parts).strip()
+        reply = outcome["reply"] = streamed or GENERATION_FALLBACK_REPLY
+        release()
+        if not streamed:
+            yield _sse("token", {"text": reply})
+        elif req.mode == "legal" and cacheable:
+            _remember_legal_answer(q_vec, kb_version, reply, sources)
+
+        outcome["saved"] = True
+        try:
+            message_id = await run_in_threadpool(_save_bot_message, conv_id, req.mode, reply, sentiment, is_crisis)
+            yield _sse("done", {"message_id": message_id, "reply": reply})
+        except Exception:
+            logger.error(f"Chat error: {traceback.format_exc()}")
+            yield _sse("error", {"detail": "Could not save the reply."})
+
+    async def finish() -> None:
+        release()  # no-op unless the stream ended before generation finished
+        if outcome["saved"]:
+            return
+        # The client left mid-reply: store what was generated so far (as /api/chat would
+        # store its reply), so the user message is never left without an answer.
+        outcome["saved"] = True
+        reply = "".join(outcome["parts"]).strip() or GENERATION_FALLBACK_REPLY
+        try:
+            await run_in_threadpool(_save_bot_message, conv_id, req.mode, reply, sentiment, is_crisis)
+        except Exception:
+            logger.error(f"Chat error: {traceback.format_exc()}")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(_after_stream, finish, conv_id),
+    )
+
+
+async def _after_stream(finish, conv_id: int) -> None:
+    await finish()  # Starlette runs this after the response, also when the client disconnected
+    await refresh_summary(conv_id, SELECTED_MODEL)
+
+
+def _settle_messages(conversation_id: int) -> None:
+    """Let queued writes for the conversation land before it is read or deleted."""
+    if MESSAGE_WRITE_BEHIND and not message_writer.wait_for(conversation_id):
+        logger.warning(f"Queued messages for conversation {conversation_id} are still pending")
+
+
+def _page(rows: list, limit: int) -> Tuple[list, Optional[int]]:
+    """Split a `limit + 1` keyset fetch into the page and the cursor for the next one."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1].id
+    return rows, None
+
+
 @app.get("/api/conversations")
-def list_conversations(current_user: AuthUser = Depends(get_current_user)) -> Dict[str, Any]:
+def list_conversations(
+    before: Optional[int] = Query(None, ge=1, description="next_cursor from the previous page"),
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: AuthPrincipal = Depends(get_current_user),
+) -> Dict[str, Any]:
+    """
+    The caller's conversations, most recently active first, one keyset page at a time.
+    Activity, preview and count are columns kept current at write time, so a page is a
+    single indexed query.
+    """
     db = SessionLocal()
     try:
-        user = db.query(User).filter(User.username == current_user.full_name).first()
-        if not user:
-            return {"conversations": []}
-        convs = (
-            db.query(Conversation)
-            .filter(Conversation.user_id == user.id)
-            .order_by(Conversation.created_at.desc())
-            .limit(50)
-            .all()
+        if current_user.user_id is None:
+            return {"conversations": [], "next_cursor": None}
+        query = db.query(Conversation).filter(Conversation.user_id == current_user.user_id)
+        if before is not None:
+            # Resume after the cursor row in (last_message_at, id) order; an unknown
+            # cursor matches nothing and yields an empty page.
+            cursor_at = (
+                db.query(Conversation.last_message_at)
+                .filter(Conversation.id == before, Conversation.user_id == current_user.user_id)
+                .scalar_subquery()
+            )
+            query = query.filter(or_(
+                Conversation.last_message_at < cursor_at,
+                and_(Conversation.last_message_at == cursor_at, Conversation.id < before),
+            ))
+        convs, next_cursor = _page(
+            query.order_by(Conversation.last_message_at.desc(), Conversation.id.desc()).limit(limit + 1).all(),
+            limit,
         )
         return {
             "conversations": [
@@ -465,9 +948,13 @@ def list_conversations(current_user: AuthUser = Depends(get_current_user)) -> Di
                     "section": c.section,
                     "title": c.title or f"Conversation #{c.id}",
                     "created_at": str(c.created_at),
+                    "last_activity": str(c.last_message_at or c.created_at),
+                    "last_message_preview": c.last_message_preview,
+                    "message_count": c.message_count or 0,
                 }
                 for c in convs
-            ]
+            ],
+            "next_cursor": next_cursor,
         }
     finally:
         db.close()
@@ -476,26 +963,32 @@ def list_conversations(current_user: AuthUser = Depends(get_current_user)) -> Di
 @app.get("/api/conversations/{conversation_id}/messages")
 def conversation_messages(
     conversation_id: int,
-    current_user: AuthUser = Depends(get_current_user),
+    before: Optional[int] = Query(None, ge=1, description="next_cursor from the previous page"),
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: AuthPrincipal = Depends(get_current_user),
 ) -> Dict[str, Any]:
+    """
+    The newest `limit` messages older than `before` (all the newest when omitted), in
+    chronological order. `next_cursor` fetches the page before this one; null at the start.
+    """
+    _settle_messages(conversation_id)
     db = SessionLocal()
     try:
-        user = db.query(User).filter(User.username == current_user.full_name).first()
         conv = db.query(Conversation).filter(Conversation.id == conversation_id).first()
         if not conv:
             raise HTTPException(status_code=404, detail="Conversation not found.")
-        if user and conv.user_id != user.id:
+        if current_user.user_id is None or conv.user_id != current_user.user_id:
             raise HTTPException(status_code=403, detail="Access denied.")
-        msgs = (
-            db.query(Message)
-            .filter(Message.conversation_id == conv.id)
-            .order_by(Message.id.asc())
-            .all()
-        )
+        query = db.query(Message).filter(Message.conversation_id == conv.id)
+        if before is not None:
+            query = query.filter(Message.id < before)
+        msgs, next_cursor = _page(query.order_by(Message.id.desc()).limit(limit + 1).all(), limit)
+        msgs.reverse()
         return {
             "conversation_id": conv.id,
             "mode": conv.section,
             "title": conv.title or f"Conversation #{conv.id}",
+            "next_cursor": next_cursor,
             "messages": [
                 {
                     "id": m.id,
@@ -515,15 +1008,15 @@ def conversation_messages(
 @app.delete("/api/conversations/{conversation_id}")
 def delete_conversation(
     conversation_id: int,
-    current_user: AuthUser = Depends(get_current_user),
+    current_user: AuthPrincipal = Depends(get_current_user),
 ) -> Dict[str, Any]:
+    _settle_messages(conversation_id)
     db = SessionLocal()
     try:
-        user = db.query(User).filter(User.username == current_user.full_name).first()
         conv = db.query(Conversation).filter(Conversation.id == conversation_id).first()
         if not conv:
             raise HTTPException(status_code=404, detail="Conversation not found.")
-        if user and conv.user_id != user.id:
+        if current_user.user_id is None or conv.user_id != current_user.user_id:
             raise HTTPException(status_code=403, detail="Access denied.")
         db.query(Message).filter(Message.conversation_id == conv.id).delete()
         db.delete(conv)
@@ -536,10 +1029,11 @@ def delete_conversation(
 @app.post("/api/session/reward")
 def session_reward(
     req: RewardRequest,
-    current_user: AuthUser = Depends(get_current_user),
+    current_user: AuthPrincipal = Depends(get_current_user),
 ) -> Dict[str, Any]:
     if not HAS_REWARDS:
         raise HTTPException(status_code=501, detail="Rewards feature is not available.")
+    _settle_messages(req.conversation_id)
     db = SessionLocal()
     try:
         conv = db.query(Conversation).filter(Conversation.id == req.conversation_id).first()
@@ -552,10 +1046,76 @@ def session_reward(
         db.close()
 
 
+def _reserve_upload_path(filename: str) -> str:
+    """Atomically claim a free path in KB_FOLDER, suffixing _1, _2, ... on collisions."""
+    target = os.path.join(KB_FOLDER, filename)
+    base, ext_dot = os.path.splitext(target)
+    i = 1
+    while True:
+        try:
+            with open(target, "xb"):
+                return target
+        except FileExistsError:
+            target = f"{base}_{i}{ext_dot}"
+            i += 1
+
+
+def _discard_upload(*paths: str) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+async def _stream_upload(upload: UploadFile, target: str, max_bytes: int) -> bool:
+    """
+    Copy an upload to `target` in UPLOAD_CHUNK_SIZE pieces without blocking the event loop.
+    Aborts and removes the partial file as soon as more than `max_bytes` have been read.
+    If the copy fails or is cancelled, the reserved `target` and the partial file are
+    both removed before the error propagates.
+    """
+    tmp_path = f"{target}.part"
+    written = 0
+    try:
+        out = await run_in_threadpool(open, tmp_path, "wb")
+        try:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_bytes:
+                    break
+                await run_in_threadpool(out.write, chunk)
+        finally:
+            out.close()
+    except BaseException:
+        # Inline, not via the threadpool: a cancelled task must not await again here.
+        _discard_upload(tmp_path, target)
+        raise
+
+    if written > max_bytes:
+        await run_in_threadpool(_discard_upload, tmp_path, target)
+        return False
+    await run_in_threadpool(os.replace, tmp_path, target)
+    return True
+
+
+def _ingest_uploaded(filenames: List[str]) -> None:
+    try:
+        chunks = ingest_files(filenames, KB_FOLDER)
+        logger.info(f"Incremental ingest of {len(filenames)} file(s) added {chunks} chunks.")
+    except Exception:
+        logger.error(f"Incremental ingest failed: {traceback.format_exc()}")
+
+
 @app.post("/api/kb/upload")
 async def upload_kb(
+    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
-    current_user: AuthUser = Depends(get_current_user),
+    ingest: bool = False,
+    current_user: AuthPrincipal = Depends(get_current_user),
 ) -> Dict[str, Any]:
     saved = []
     max_bytes = MAX_FILE_SIZE_MB * 1024 * 1024
@@ -565,23 +1125,22 @@ async def upload_kb(
         ext = f.filename.rsplit(".", 1)[-1].lower() if "." in f.filename else ""
         if ext not in {"txt", "pdf"}:
             continue
-        content = await f.read()
-        if len(content) > max_bytes:
+        if f.size is not None and f.size > max_bytes:
             continue
-        target = os.path.join(KB_FOLDER, f.filename)
-        base, ext_dot = os.path.splitext(target)
-        i = 1
-        while os.path.exists(target):
-            target = f"{base}_{i}{ext_dot}"
-            i += 1
-        with open(target, "wb") as out:
-            out.write(content)
-        saved.append(os.path.basename(target))
-    return {"saved_files": saved, "count": len(saved)}
+        target = await run_in_threadpool(_reserve_upload_path, os.path.basename(f.filename))
+        if await _stream_upload(f, target, max_bytes):
+            saved.append(os.path.basename(target))
+
+    # Opt-in: index only the newly saved documents once the response has been sent.
+    queued = []
+    if ingest and saved and HAS_RETRIEVAL and ingest_files:
+        background_tasks.add_task(_ingest_uploaded, saved)
+        queued = saved
+    return {"saved_files": saved, "count": len(saved), "queued_for_ingest": queued}
 
 
 @app.post("/api/kb/ingest")
-def ingest_kb(current_user: AuthUser = Depends(get_current_user)) -> Dict[str, Any]:
+def ingest_kb(current_user: AuthPrincipal = Depends(get_current_user)) -> Dict[str, Any]:
     if not HAS_RETRIEVAL or not ingest_folder:
         raise HTTPException(status_code=501, detail="Retrieval ingestion is not available.")
     try:
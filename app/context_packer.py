@@ -0,0 +1,115 @@
+# app/context_packer.py  (token-budgeted context for legal-mode prompts)
+import math
+import os
+import re
+import threading
+
+LEGAL_CONTEXT_TOKENS = int(os.getenv("LEGAL_CONTEXT_TOKENS", "1500"))
+# Gemini tokenizes English legal text at roughly four characters per token.
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", "4"))
+SOURCE_PREVIEW_CHARS = 400
+
+_SENTENCE_END = re.compile(r"[.!?;:](?=\s)|\n")
+
+_lock = threading.Lock()
+_totals = {"requests": 0, "input_tokens": 0, "context_tokens": 0, "passages_retrieved": 0, "blocks_packed": 0}
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def _merge_adjacent(passages):
+    """
+    Merge retrieved chunks of the same source whose spans touch or overlap, dropping the
+    duplicated overlap text. Chunks without a `start` offset (older indexes) stay separate.
+    """
+    blocks = []
+    by_source = {}
+    for p in passages:
+        text = p.get("text") or ""
+        if not text:
+            continue
+        block = {
+            "source": p.get("source", "unknown"),
+            "start": p.get("start"),
+            "text": text,
+            "score": float(p.get("score") or 0.0),
+        }
+        if block["start"] is None:
+            blocks.append(block)
+        else:
+            by_source.setdefault(block["source"], []).append(block)
+
+    for spans in by_source.values():
+        spans.sort(key=lambda b: b["start"])
+        current = spans[0]
+        for nxt in spans[1:]:
+            end = current["start"] + len(current["text"])
+            if nxt["start"] <= end:
+                current["text"] += nxt["text"][end - nxt["start"]:]
+                current["score"] = max(current["score"], nxt["score"])
+            else:
+                blocks.append(current)
+                current = nxt
+        blocks.append(current)
+    return blocks
+
+
+def _trim_to_sentence(text: str, max_chars: int) -> str:
+    head = text[:max_chars]
+    ends = [m.end() for m in _SENTENCE_END.finditer(head)]
+    return head[: ends[-1]].rstrip() if ends else ""
+
+
+def pack_context(passages, budget: int = LEGAL_CONTEXT_TOKENS):
+    """
+    Fill `budget` tokens greedily with the highest-scoring passages, using their full
+    chunk text. Returns (context_text, packed_blocks, context_tokens). A top passage
+    that alone exceeds the budget is cut at its last sentence end that fits.
+    """
+    blocks = sorted(_merge_adjacent(passages or []), key=lambda b: b["score"], reverse=True)
+    parts, packed, used = [], [], 0
+    for block in blocks:
+        entry = f"[{block['source']}] {block['text'].strip()}\n\n"
+        cost = estimate_tokens(entry)
+        if used + cost > budget:
+            if packed:
+                continue
+            trimmed = _trim_to_sentence(block["text"].strip(), int((budget - used) * CHARS_PER_TOKEN))
+            if not trimmed:
+                continue
+            entry = f"[{block['source']}] {trimmed}\n\n"
+            cost = estimate_tokens(entry)
+        parts.append(entry)
+        packed.append(block)
+        used += cost
+    return "".join(parts), packed, used
+
+
+def record(prompt: str, context_tokens: int, retrieved: int, packed: int) -> int:
+    """Account one legal prompt; returns its estimated input tokens."""
+    tokens = estimate_tokens(prompt)
+    with _lock:
+        _totals["requests"] += 1
+        _totals["input_tokens"] += tokens
+        _totals["context_tokens"] += context_tokens
+        _totals["passages_retrieved"] += retrieved
+        _totals["blocks_packed"] += packed
+    return tokens
+
+
+def source_refs(passages, preview_chars: int = SOURCE_PREVIEW_CHARS):
+    """Passages as returned to clients: the full chunk text shortened to a preview."""
+    return [{**p, "text": (p.get("text") or "")[:preview_chars]} for p in passages or []]
+
+
+def stats() -> dict:
+    with _lock:
+        totals = dict(_totals)
+    n = totals["requests"]
+    return {
+        "budget_tokens": LEGAL_CONTEXT_TOKENS,
+        **totals,
+        "avg_input_tokens": round(totals["input_tokens"] / n, 1) if n else 0.0,
+    }
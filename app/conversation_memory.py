@@ -0,0 +1,150 @@
+# app/conversation_memory.py  (bounded multi-turn context: recent turns + rolling summary)
+import os
+import threading
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.api_client import DEFAULT_MODEL, FALLBACK_MESSAGES, _generate_safe_async
+from app.context_packer import estimate_tokens
+from app.db import Conversation, Message, SessionLocal
+
+HISTORY_TURNS = int(os.getenv("HISTORY_TURNS", "6"))            # messages replayed verbatim
+HISTORY_TOKENS = int(os.getenv("HISTORY_TOKENS", "800"))        # budget for summary + verbatim turns
+SUMMARY_BATCH = int(os.getenv("SUMMARY_BATCH", "4"))            # most messages folded per summary update
+SUMMARY_MAX_CHARS = int(os.getenv("SUMMARY_MAX_CHARS", "1200"))
+
+SUMMARY_SYSTEM = (
+    "You maintain a short running summary of a conversation between a user and an assistant. "
+    "Keep facts, the user's situation and open questions; drop pleasantries. "
+    "Never exceed 120 words."
+)
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _speaker(sender: str) -> str:
+    return "User" if sender == "user" else "Assistant"
+
+
+def load_history(db, conv: Conversation, pending=()) -> str:
+    """
+    Context for the next turn: the conversation summary plus the last HISTORY_TURNS
+    unsummarized messages, oldest dropped first to stay within HISTORY_TOKENS. Call it
+    before storing the new user message; `pending` are rows still queued for writing.
+    Reads a fixed number of rows however long the conversation is.
+    """
+    recent = (
+        db.query(Message.sender, Message.text)
+        .filter(Message.conversation_id == conv.id, Message.id > (conv.summary_through or 0))
+        .order_by(Message.id.desc())
+        .limit(HISTORY_TURNS)
+        .all()
+    )
+    queued = [(row["sender"], row["text"]) for row in reversed(pending)]
+    recent = (queued + list(recent))[:HISTORY_TURNS]
+    summary = (conv.summary or "")[:SUMMARY_MAX_CHARS]
+    budget = HISTORY_TOKENS - estimate_tokens(summary)
+    lines = []
+    for sender, text in recent:
+        line = f"{_speaker(sender)}: {text}"
+        budget -= estimate_tokens(line)
+        if budget < 0:
+            break
+        lines.append(line)
+    lines.reverse()
+
+    parts = []
+    if summary:
+        parts.append(f"Summary of earlier conversation: {summary}")
+    if lines:
+        parts.append("Recent turns:\n" + "\n".join(lines))
+    return "\n".join(parts)
+
+
+def _pending_batch(conv_id: int):
+    """
+    The oldest unsummarized messages outside the verbatim window (at most SUMMARY_BATCH),
+    or None while every unsummarized message still fits in the window. Folding as soon as
+    one message leaves the window means no message is ever in neither.
+    """
+    db = SessionLocal()
+    try:
+        conv = db.query(Conversation).filter(Conversation.id == conv_id).first()
+        if conv is None:
+            return None
+        rows = (
+            db.query(Message.id, Message.sender, Message.text)
+            .filter(Message.conversation_id == conv_id, Message.id > (conv.summary_through or 0))
+            .order_by(Message.id)
+            .limit(HISTORY_TURNS + SUMMARY_BATCH)
+            .all()
+        )
+        outside = min(SUMMARY_BATCH, len(rows) - HISTORY_TURNS)
+        if outside <= 0:
+            return None
+        return conv.summary_through, conv.summary or "", rows[:outside]
+    finally:
+        db.close()
+
+
+def _summary_prompt(previous: str, rows) -> str:
+    transcript = "\n".join(f"{_speaker(sender)}: {text}" for _, sender, text in rows)
+    return (
+        f"Current summary: {previous or '(none)'}\n\n"
+        f"New turns:\n{transcript}\n\n"
+        "Rewrite the summary so it also covers the new turns."
+    )
+
+
+def _store_summary(conv_id: int, expected_through, summary: str, through: int) -> bool:
+    db = SessionLocal()
+    try:
+        # Only advance from the state the summary was built on.
+        same_state = (
+            Conversation.summary_through.is_(None)
+            if expected_through is None
+            else Conversation.summary_through == expected_through
+        )
+        updated = (
+            db.query(Conversation)
+            .filter(Conversation.id == conv_id, same_state)
+            .update({"summary": summary[:SUMMARY_MAX_CHARS], "summary_through": through}, synchronize_session=False)
+        )
+        db.commit()
+        return bool(updated)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def refresh_summary(conv_id: int, model_name: str | None = None) -> bool:
+    """
+    Fold the messages that left the verbatim window (up to SUMMARY_BATCH) into the
+    conversation summary. Meant to run after the reply is sent; a no-op while the
+    window still holds every unsummarized message, and at most one refresh per
+    conversation runs at a time.
+    """
+    with _refreshing_lock:
+        if conv_id in _refreshing:
+            return False
+        _refreshing.add(conv_id)
+    try:
+        batch = await run_in_threadpool(_pending_batch, conv_id)
+        if batch is None:
+            return False
+        expected_through, previous, rows = batch
+        summary = await _generate_safe_async(
+            model_name or DEFAULT_MODEL, _summary_prompt(previous, rows), system=SUMMARY_SYSTEM
+        )
+        if not summary or summary in FALLBACK_MESSAGES:
+            return False
+        return await run_in_threadpool(_store_summary, conv_id, expected_through, summary, rows[-1][0])
+    except Exception as e:
+        print("Conversation summary update failed:", e)
+        return False
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(conv_id)
@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, JSON, Boolean, event
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, JSON, Boolean, Index, event, case, func, update
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship
 from datetime import datetime
@@ -15,6 +15,7 @@ DATABASE_URL = (
 )
 LOCAL_DB_FALLBACK_URL = os.getenv("LOCAL_DB_FALLBACK_URL", DEFAULT_SQLITE_URL)
 ALLOW_DB_FALLBACK = os.getenv("ALLOW_DB_FALLBACK", "true").lower() not in {"0", "false", "no"}
+PREVIEW_CHARS = int(os.getenv("CONVERSATION_PREVIEW_CHARS", "120"))
 
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
@@ -89,8 +90,11 @@ class User(Base):
 
 class AuthUser(Base):
     __tablename__ = "auth_users"
+    __table_args__ = (Index("uq_auth_users_user_id", "user_id", unique=True),)
 
     id = Column(Integer, primary_key=True)
+    # The User row that owns this account's conversations.
+    user_id = Column(Integer, ForeignKey("users.id", name="fk_auth_users_user_id"), nullable=True)
     full_name = Column(String, nullable=False)
     phone = Column(String, unique=True, nullable=False)
     email = Column(String, unique=True, nullable=False)
@@ -100,15 +104,28 @@ class AuthUser(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    user = relationship("User")
+
 
 class Conversation(Base):
     __tablename__ = "conversations"
+    __table_args__ = (
+        # A user's conversation list, most recently active first.
+        Index("ix_conversations_user_id_last_message_at", "user_id", "last_message_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     section = Column(String)       # mental or legal
     title = Column(String, nullable=True)
+    # Rolling summary of the turns up to and including message id `summary_through`.
+    summary = Column(Text, nullable=True)
+    summary_through = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Denormalized for the conversation list; kept current by touch_conversation().
+    last_message_at = Column(DateTime, default=datetime.utcnow)
+    last_message_preview = Column(String, nullable=True)
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     user = relationship("User")
     messages = relationship("Message", back_populates="conversation", order_by="Message.id")
@@ -116,6 +133,8 @@ class Conversation(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    # History loads: one conversation's messages in id order (also covers conversation_id alone).
+    __table_args__ = (Index("ix_messages_conversation_id_id", "conversation_id", "id"),)
 
     id = Column(Integer, primary_key=True)
     conversation_id = Column(Integer, ForeignKey("conversations.id"))
@@ -130,6 +149,8 @@ class Message(Base):
 
 class RateLimit(Base):
     __tablename__ = "rate_limits"
+    # One row per user; the shared rate limiter upserts on it.
+    __table_args__ = (Index("uq_rate_limits_auth_user_id", "auth_user_id", unique=True),)
 
     id = Column(Integer, primary_key=True)
     auth_user_id = Column(Integer, ForeignKey("auth_users.id"))
@@ -137,15 +158,62 @@ class RateLimit(Base):
     request_count = Column(Integer, default=0)
 
 
+def touch_conversation(db, conversation_id, text, at, count=1):
+    """
+    Account for `count` new messages (the newest being `text` at `at`) on the
+    conversation's list columns. Call it in the transaction that inserts them; the
+    count is incremented atomically and an older write never replaces a newer preview.
+    """
+    newer = Conversation.last_message_at.is_(None) | (Conversation.last_message_at <= at)
+    db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values(
+            message_count=func.coalesce(Conversation.message_count, 0) + count,
+            last_message_at=case((newer, at), else_=Conversation.last_message_at),
+            last_message_preview=case((newer, (text or "")[:PREVIEW_CHARS]), else_=Conversation.last_message_preview),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+BASELINE_REVISION = "0001_baseline"
+
+
+def _migrate():
+    """
+    Bring the schema to the latest Alembic revision. A new database is created from the
+    models and stamped; one created by create_all before migrations existed is stamped
+    at the baseline first so only the later revisions run.
+    """
+    from alembic import command
+    from alembic.config import Config
+    from sqlalchemy import inspect
+
+    cfg = Config(ALEMBIC_INI)
+    with engine.begin() as conn:
+        cfg.attributes["connection"] = conn
+        tables = set(inspect(conn).get_table_names())
+        if not tables - {"alembic_version"}:
+            Base.metadata.create_all(conn)
+            command.stamp(cfg, "head")
+            return
+        if "alembic_version" not in tables:
+            command.stamp(cfg, BASELINE_REVISION)
+        command.upgrade(cfg, "head")
+        Base.metadata.create_all(conn)
+
+
 def init_db():
     # For PostgreSQL, ensure the data folder isn't needed
     if _using_sqlite():
         os.makedirs("data", exist_ok=True)
     try:
-        Base.metadata.create_all(engine)
+        _migrate()
     except OperationalError as exc:
         _switch_to_local_db(exc)
-        Base.metadata.create_all(engine)
+        _migrate()
     print(f"[DB] Connected to: {_db_label()}")
 
 def ping_db():
@@ -7,6 +7,8 @@ from math import ceil
 from google.cloud import aiplatform
 from google.auth import default as google_auth_default
 
+from app.singleflight import SingleFlight
+
 # Configuration - replace model if you want another one
 # Recommended models: "textembedding-gecko@001" (or check Vertex AI docs for latest)
 EMBEDDING_MODEL = os.getenv("VERTEX_EMBEDDING_MODEL", "textembedding-gecko@001")
@@ -16,6 +18,9 @@ PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT")  # optional, picks up from credentia
 # Batch size - tune based on model/token limits and your latency budget
 BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "16"))
 
+# Concurrent requests to embed the exact same texts share one Vertex call.
+_embeddings = SingleFlight("embeddings")
+
 
 def _init_client():
     """
@@ -38,7 +43,10 @@ def embed_texts(texts: List[str]) -> List[List[float]]:
     """
     if not texts:
         return []
+    return _embeddings.do(tuple(texts), _embed_texts, list(texts))
+
 
+def _embed_texts(texts: List[str]) -> List[List[float]]:
     # initialize
     _init_client()
 
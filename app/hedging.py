@@ -0,0 +1,89 @@
+# app/hedging.py  (opt-in hedged requests to cut generation tail latency)
+import os
+import threading
+from collections import deque
+
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() in {"1", "true", "yes"}
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY_S = float(os.getenv("HEDGE_MIN_DELAY_S", "1.0"))
+HEDGE_DEFAULT_DELAY_S = float(os.getenv("HEDGE_DEFAULT_DELAY_S", "4.0"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "200"))
+HEDGE_MAX_RATE = float(os.getenv("HEDGE_MAX_RATE", "0.05"))
+# Optional secondary model for the hedge; defaults to the request's own model.
+HEDGE_MODEL = os.getenv("HEDGE_MODEL") or None
+
+
+class HedgePolicy:
+    """
+    Decides when to fire a backup request: after the observed `percentile` latency
+    (floored at `min_delay`), and only while hedges stay within `max_rate` of requests.
+    """
+
+    def __init__(
+        self,
+        enabled=HEDGE_ENABLED,
+        percentile=HEDGE_PERCENTILE,
+        min_delay=HEDGE_MIN_DELAY_S,
+        default_delay=HEDGE_DEFAULT_DELAY_S,
+        min_samples=HEDGE_MIN_SAMPLES,
+        window=HEDGE_WINDOW,
+        max_rate=HEDGE_MAX_RATE,
+        model=HEDGE_MODEL,
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.max_rate = max_rate
+        self.model = model
+        self._latencies = deque(maxlen=max(1, window))
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.fired = 0
+        self.won = 0
+        self.denied = 0
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def record_latency(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def delay(self) -> float:
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < self.min_samples:
+            return max(self.min_delay, self.default_delay)
+        idx = min(len(samples) - 1, int(len(samples) * self.percentile / 100.0))
+        return max(self.min_delay, samples[idx])
+
+    def try_acquire(self) -> bool:
+        """Reserve budget for one hedge; False once hedges would exceed max_rate of requests."""
+        with self._lock:
+            if self.fired + 1 > self.max_rate * self.requests:
+                self.denied += 1
+                return False
+            self.fired += 1
+            return True
+
+    def record_win(self) -> None:
+        with self._lock:
+            self.won += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "requests": self.requests,
+                "hedges_fired": self.fired,
+                "hedges_won": self.won,
+                "budget_denied": self.denied,
+                "samples": len(self._latencies),
+            }
+
+
+hedger = HedgePolicy()
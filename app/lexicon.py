@@ -0,0 +1,62 @@
+# app/lexicon.py  (weighted sentiment lexicon — first tier of the sentiment cascade)
+import re
+
+# Word -> polarity weight (-3 strongly negative ... +3 strongly positive), tuned for
+# the short first-person messages typical of mental-health chats.
+LEXICON = {
+    # positive
+    "happy": 2.0, "great": 2.0, "wonderful": 2.5, "excited": 2.0, "joyful": 2.5,
+    "grateful": 2.0, "thankful": 2.0, "good": 1.5, "amazing": 2.5, "love": 2.0,
+    "loved": 2.0, "fantastic": 2.5, "glad": 1.5, "calm": 1.5, "relaxed": 1.5,
+    "peaceful": 2.0, "hopeful": 2.0, "proud": 2.0, "better": 1.0, "confident": 1.5,
+    "motivated": 1.5, "content": 1.5, "relieved": 1.5, "safe": 1.0, "supported": 1.5,
+    "blessed": 2.0, "cheerful": 2.0, "optimistic": 2.0, "fine": 0.5, "thanks": 1.0,
+    "thank": 1.0, "helps": 1.0, "helped": 1.0, "enjoy": 1.5, "enjoyed": 1.5,
+    "awesome": 2.5, "nice": 1.0, "okay": 0.5, "progress": 1.0,
+    # negative
+    "sad": -2.0, "depressed": -3.0, "depression": -2.5, "anxious": -2.0, "anxiety": -2.0,
+    "afraid": -2.0, "scared": -2.0, "angry": -2.0, "hopeless": -3.0, "terrible": -2.5,
+    "awful": -2.5, "hate": -2.5, "miserable": -3.0, "lonely": -2.0, "alone": -1.5,
+    "stressed": -2.0, "stress": -1.5, "overwhelmed": -2.0, "worried": -1.5, "worry": -1.5,
+    "tired": -1.0, "exhausted": -2.0, "empty": -2.0, "worthless": -3.0, "useless": -2.5,
+    "broken": -2.0, "hurt": -2.0, "hurting": -2.0, "pain": -2.0, "crying": -2.0,
+    "cry": -1.5, "upset": -2.0, "frustrated": -2.0, "nervous": -1.5, "panic": -2.5,
+    "guilty": -2.0, "ashamed": -2.0, "numb": -2.0, "bad": -1.5, "worse": -2.0,
+    "worst": -2.5, "struggling": -2.0, "insomnia": -1.5, "grief": -2.5, "lost": -1.5,
+    "rejected": -2.0, "failure": -2.0, "failed": -1.5, "suffering": -2.5, "fear": -2.0,
+    "unhappy": -2.0, "horrible": -2.5, "disappointed": -2.0, "heartbroken": -3.0,
+}
+
+NEGATORS = {
+    "not", "no", "never", "nothing", "hardly", "barely", "dont", "don't", "cant", "can't",
+    "cannot", "isnt", "isn't", "wasnt", "wasn't", "arent", "aren't", "didnt", "didn't",
+    "wont", "won't", "aint", "ain't", "nor", "without",
+}
+INTENSIFIERS = {"very": 1.5, "so": 1.4, "really": 1.4, "extremely": 1.8, "too": 1.3, "super": 1.5, "totally": 1.5}
+NEGATION_WINDOW = 3
+
+_TOKEN_RE = re.compile(r"[a-z']+")
+
+
+def score_lexicon(text: str) -> tuple[float, float, float]:
+    """
+    Score `text` against LEXICON with simple negation and intensifier handling.
+    Returns: (net_score, positive_mass, negative_mass)
+    """
+    tokens = _TOKEN_RE.findall(text.lower())
+    pos = neg = 0.0
+    for i, tok in enumerate(tokens):
+        weight = LEXICON.get(tok)
+        if weight is None:
+            continue
+        window = tokens[max(0, i - NEGATION_WINDOW) : i]
+        if i and tokens[i - 1] in INTENSIFIERS:
+            weight *= INTENSIFIERS[tokens[i - 1]]
+        if any(w in NEGATORS for w in window):
+            # "not happy" reads as mildly negative, "not bad" as mildly positive
+            weight *= -0.5
+        if weight > 0:
+            pos += weight
+        else:
+            neg -= weight
+    return pos - neg, pos, neg
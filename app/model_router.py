@@ -0,0 +1,146 @@
+# app/model_router.py  (model fallback chain, per-model circuit breakers, jittered backoff)
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+
+# Ordered fallbacks tried after the requested model, e.g. "models/gemini-2.5-flash-lite".
+MODEL_FALLBACKS = [m.strip() for m in os.getenv("MODEL_FALLBACKS", "").split(",") if m.strip()]
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_COOLDOWN_S = float(os.getenv("BREAKER_COOLDOWN_S", "30"))
+GENERATION_DEADLINE_S = float(os.getenv("GENERATION_DEADLINE_S", "30"))
+BACKOFF_BASE_S = float(os.getenv("BACKOFF_BASE_S", "0.5"))
+BACKOFF_MAX_S = float(os.getenv("BACKOFF_MAX_S", "8"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+QUOTA, ERRORS = "quota", "errors"  # why a breaker last opened
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(max, base * 2**attempt)]."""
+    return random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * (2**attempt)))
+
+
+class CircuitBreaker:
+    """
+    Closed: calls flow; `failure_threshold` consecutive failures (or one quota error) open it.
+    Open: calls are skipped until `cooldown` seconds pass, then it half-opens.
+    Half-open: a single probe call is let through; success closes it, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, cooldown=BREAKER_COOLDOWN_S):
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.trips = 0
+        self.cause = None  # QUOTA or ERRORS while open or half-open, else None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        return self.admit() is not None
+
+    def admit(self):
+        """
+        Like allow(), but says what was granted: None when refused, True when the call is
+        the half-open probe (which must end in record_success, record_failure or release),
+        False for an ordinary call.
+        """
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    return None
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN:
+                if self._probing:
+                    return None
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+            self.cause = None
+
+    def record_failure(self, trip: bool = False) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if trip or self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.trips += 1
+                self._state = OPEN
+                self.cause = QUOTA if trip else ERRORS
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """End a half-open probe that produced no health signal."""
+        with self._lock:
+            self._probing = False
+
+
+class ModelRouter:
+    """Builds the fallback chain for a request and keeps per-model breakers and routing counters."""
+
+    def __init__(self, fallbacks=None):
+        self.fallbacks = list(MODEL_FALLBACKS if fallbacks is None else fallbacks)
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: defaultdict(int))
+
+    def chain(self, primary: str) -> list:
+        seen = []
+        for name in [primary, *self.fallbacks]:
+            if name not in seen:
+                seen.append(name)
+        return seen
+
+    def breaker(self, model_name: str) -> CircuitBreaker:
+        with self._lock:
+            if model_name not in self._breakers:
+                self._breakers[model_name] = CircuitBreaker()
+            return self._breakers[model_name]
+
+    def exhausted(self, primary: str) -> bool:
+        """True while every model in primary's chain has an open breaker."""
+        with self._lock:
+            breakers = [self._breakers.get(name) for name in self.chain(primary)]
+        return all(breaker is not None and breaker.state == OPEN for breaker in breakers)
+
+    def count(self, model_name: str, event: str) -> None:
+        with self._lock:
+            self._counts[model_name][event] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            names = set(self._breakers) | set(self._counts)
+            breakers = dict(self._breakers)
+            counts = {name: dict(self._counts[name]) for name in names}
+        return {
+            "chain_fallbacks": self.fallbacks,
+            "models": {
+                name: {
+                    "state": breakers[name].state if name in breakers else CLOSED,
+                    "trips": breakers[name].trips if name in breakers else 0,
+                    "cause": breakers[name].cause if name in breakers else None,
+                    **counts[name],
+                }
+                for name in sorted(names)
+            },
+        }
+
+
+router = ModelRouter()
@@ -0,0 +1,77 @@
+# app/passwords.py  (PBKDF2 password hashing kept off the API threads, with its own cap)
+import asyncio
+import hashlib
+import hmac
+import os
+
+from app.admission import AdaptiveLimiter
+from app.process_pool import RestartingProcessPool
+
+PBKDF2_ITERATIONS = 120000  # changing this invalidates every stored hash
+
+PASSWORD_EXECUTOR = os.getenv("PASSWORD_EXECUTOR", "process").lower()   # process | thread
+# Cores a login burst may take; the rest stay free for chat.
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Hashes in flight at once (enough to keep every worker busy); the rest wait in a
+# bounded queue without holding a thread, and are shed with 503 beyond it.
+PASSWORD_CONCURRENCY = int(os.getenv("PASSWORD_CONCURRENCY", str(2 * PASSWORD_WORKERS)))
+PASSWORD_QUEUE_SIZE = int(os.getenv("PASSWORD_QUEUE_SIZE", "64"))
+PASSWORD_QUEUE_TIMEOUT_S = float(os.getenv("PASSWORD_QUEUE_TIMEOUT_S", "3"))
+PASSWORD_HASH_TIMEOUT_S = float(os.getenv("PASSWORD_HASH_TIMEOUT_S", "10"))
+
+
+def hash_password(password: str, salt: str) -> str:
+    raw = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt.encode("utf-8"), PBKDF2_ITERATIONS)
+    return raw.hex()
+
+
+def verify_password(password: str, salt: str, expected_hash: str) -> bool:
+    return hmac.compare_digest(hash_password(password, salt), expected_hash)
+
+
+# A fixed limit (min == max) rather than an adaptive one: the cost per call is known.
+_limiter = AdaptiveLimiter(
+    "passwords",
+    initial=PASSWORD_CONCURRENCY,
+    min_limit=PASSWORD_CONCURRENCY,
+    max_limit=PASSWORD_CONCURRENCY,
+    queue_size=PASSWORD_QUEUE_SIZE,
+    queue_timeout=PASSWORD_QUEUE_TIMEOUT_S,
+    latency_target=PASSWORD_HASH_TIMEOUT_S,
+)
+
+_pool = None
+if PASSWORD_EXECUTOR == "process":
+    _pool = RestartingProcessPool("passwords", workers=PASSWORD_WORKERS, timeout=PASSWORD_HASH_TIMEOUT_S)
+
+
+async def _offload(fn, *args):
+    """Run fn(*args) under the cap; raises admission.Overloaded or process_pool.WorkerPoolError."""
+    started = await _limiter.acquire()
+    try:
+        if _pool is not None:
+            return await _pool.run_async(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+    finally:
+        _limiter.release(started)
+
+
+async def hash_password_async(password: str, salt: str) -> str:
+    return await _offload(hash_password, password, salt)
+
+
+async def verify_password_async(password: str, salt: str, expected_hash: str) -> bool:
+    return await _offload(verify_password, password, salt, expected_hash)
+
+
+def shutdown() -> None:
+    if _pool is not None:
+        _pool.shutdown()
+
+
+def stats() -> dict:
+    return {
+        "executor": PASSWORD_EXECUTOR,
+        "limiter": _limiter.stats(),
+        "pool": _pool.stats() if _pool is not None else None,
+    }
@@ -0,0 +1,118 @@
+# app/process_pool.py  (self-healing process pool for CPU-heavy work kept off the API threads)
+import asyncio
+import multiprocessing as mp
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+
+class WorkerPoolError(RuntimeError):
+    """A pooled call failed: its worker crashed or timed out, or the pool was being replaced."""
+
+
+class RestartingProcessPool:
+    """
+    A small ProcessPoolExecutor wrapper with per-call timeouts that replaces the
+    pool when a worker dies or hangs. Workers use the "spawn" start method so they
+    never inherit the server's threads, sockets or torch state.
+    """
+
+    def __init__(self, name, workers=1, initializer=None, initargs=(), timeout=None, on_restart=None):
+        self.name = name
+        self.workers = max(1, int(workers))
+        self.timeout = timeout
+        self._initializer = initializer
+        self._initargs = initargs
+        self._on_restart = on_restart
+        self._ctx = mp.get_context("spawn")
+        self._executor = None
+        self._lock = threading.Lock()
+        self.restarts = 0
+        self.timeouts = 0
+        self.crashes = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=self._ctx,
+                    initializer=self._initializer,
+                    initargs=self._initargs,
+                )
+            return self._executor
+
+    def _restart(self, executor):
+        with self._lock:
+            if self._executor is not executor:
+                return  # another caller already replaced it
+            self._executor = None
+            self.restarts += 1
+        # shutdown() does not stop a running task, so terminate hung workers explicitly.
+        for proc in list((getattr(executor, "_processes", None) or {}).values()):
+            if proc.is_alive():
+                proc.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        print(f"[{self.name}] worker pool restarted ({self.restarts} so far).")
+        if self._on_restart:
+            self._on_restart()
+
+    def _submit(self, executor, fn, *args):
+        try:
+            return executor.submit(fn, *args)
+        except BrokenProcessPool:
+            raise
+        except RuntimeError as e:
+            # The executor was shut down between _get_executor() and submit(): a concurrent
+            # restart or shutdown() swapped it out.
+            raise WorkerPoolError(f"{self.name} pool is restarting") from e
+
+    def run(self, fn, *args, timeout=None):
+        """Run fn(*args) in a worker and return its result, restarting the pool on crash/timeout."""
+        executor = self._get_executor()
+        try:
+            return self._submit(executor, fn, *args).result(timeout=timeout or self.timeout)
+        except BrokenProcessPool as e:
+            self.crashes += 1
+            self._restart(executor)
+            raise WorkerPoolError(f"{self.name} worker crashed") from e
+        except FuturesTimeout as e:
+            self.timeouts += 1
+            self._restart(executor)
+            raise WorkerPoolError(f"{self.name} call timed out") from e
+
+    async def run_async(self, fn, *args, timeout=None):
+        """Like run(), but awaits the result instead of blocking the calling thread."""
+        executor = self._get_executor()
+        try:
+            future = asyncio.wrap_future(self._submit(executor, fn, *args))
+            return await asyncio.wait_for(future, timeout=timeout or self.timeout)
+        except BrokenProcessPool as e:
+            self.crashes += 1
+            self._restart(executor)
+            raise WorkerPoolError(f"{self.name} worker crashed") from e
+        except asyncio.TimeoutError as e:
+            self.timeouts += 1
+            self._restart(executor)
+            raise WorkerPoolError(f"{self.name} call timed out") from e
+
+    def warm(self, fn, timeout=None):
+        """Start every worker (running the initializer) and call fn once in each."""
+        executor = self._get_executor()
+        futures = [self._submit(executor, fn) for _ in range(self.workers)]
+        return [f.result(timeout=timeout) for f in futures]
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "restarts": self.restarts,
+            "crashes": self.crashes,
+            "timeouts": self.timeouts,
+        }
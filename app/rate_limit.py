@@ -0,0 +1,89 @@
+# app/rate_limit.py  (per-user chat rate limiting with pluggable backends)
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, Integer, bindparam, text
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()   # memory | db
+RATE_LIMIT_MAX = int(os.getenv("RATE_LIMIT_MAX", "30"))
+RATE_LIMIT_WINDOW_MINUTES = int(os.getenv("RATE_LIMIT_WINDOW_MINUTES", "60"))
+
+
+class SlidingWindowLimiter:
+    """
+    In-process sliding-window log: at most `limit` hits in any `window` seconds per key.
+    Exact and lock-protected, with no I/O; counts are per process, so use it for
+    single-node deployments.
+    """
+
+    def __init__(self, limit=RATE_LIMIT_MAX, window=RATE_LIMIT_WINDOW_MINUTES * 60):
+        self.limit = limit
+        self.window = window
+        self._hits = {}
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + window
+
+    def hit(self, key, db=None):
+        """Record one hit; returns (allowed, retry_after_seconds)."""
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            hits = self._hits.setdefault(key, deque())
+            while hits and hits[0] <= now - self.window:
+                hits.popleft()
+            if len(hits) >= self.limit:
+                return False, max(1, math.ceil(hits[0] + self.window - now))
+            hits.append(now)
+            return True, 0
+
+    def _sweep(self, now):
+        # Forget users idle for a whole window so memory tracks active users only.
+        self._hits = {k: v for k, v in self._hits.items() if v and v[-1] > now - self.window}
+        self._next_sweep = now + self.window
+
+
+class DatabaseRateLimiter:
+    """
+    Fixed window shared by every worker, kept in `rate_limits` and advanced by one
+    atomic upsert per hit (PostgreSQL and SQLite >= 3.35). The statement runs in the
+    caller's session and is committed with the rest of the turn.
+    """
+
+    UPSERT = text(
+        """
+        INSERT INTO rate_limits (auth_user_id, window_start, request_count)
+        VALUES (:uid, :now, 1)
+        ON CONFLICT (auth_user_id) DO UPDATE SET
+            window_start = CASE WHEN rate_limits.window_start < :cutoff
+                                THEN excluded.window_start ELSE rate_limits.window_start END,
+            request_count = CASE WHEN rate_limits.window_start < :cutoff
+                                 THEN 1 ELSE rate_limits.request_count + 1 END
+        RETURNING window_start, request_count
+        """
+    ).bindparams(
+        bindparam("now", type_=DateTime), bindparam("cutoff", type_=DateTime)
+    ).columns(window_start=DateTime, request_count=Integer)
+
+    def __init__(self, limit=RATE_LIMIT_MAX, window=RATE_LIMIT_WINDOW_MINUTES * 60):
+        self.limit = limit
+        self.window = window
+
+    def hit(self, key, db):
+        now = datetime.utcnow()
+        params = {"uid": key, "now": now, "cutoff": now - timedelta(seconds=self.window)}
+        window_start, count = db.execute(self.UPSERT, params).one()
+        if count <= self.limit:
+            return True, 0
+        reset_at = window_start + timedelta(seconds=self.window)
+        return False, max(1, math.ceil((reset_at - now).total_seconds()))
+
+
+def make_rate_limiter(backend=RATE_LIMIT_BACKEND):
+    if backend == "db":
+        return DatabaseRateLimiter()
+    return SlidingWindowLimiter()
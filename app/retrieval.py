@@ -1,6 +1,8 @@
 # app/retrieval.py  (OpenAI embeddings + cosine similarity)
 import os
 import json
+import threading
+import uuid
 import pdfplumber
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
@@ -9,6 +11,12 @@ from app.embeddings import embed_texts
 INDEX_EMBED_PATH = "data/embeddings.npy"
 INDEX_META_PATH = "data/embeddings_meta.json"
 
+# Full and incremental ingestion both rewrite the index files; serialize them.
+_INDEX_LOCK = threading.Lock()
+
+# Parsed index kept in memory and reloaded only when the metadata file changes.
+_loaded = {"mtime": None, "embeddings": None, "metas": None, "version": None}
+
 
 def extract_text_from_pdf(pdf_path):
     text = ""
@@ -34,45 +42,42 @@ def chunk_text(text, chunk_size=1000, overlap=200):
     return chunks
 
 
-def ingest_folder(folder="data/kb_docs", batch_size=16):
-    """
-    Read .txt and .pdf files from `folder`, chunk them, create embeddings using embed_texts(),
-    and save embeddings + metadata to disk.
-    """
-    os.makedirs("data", exist_ok=True)
+def _read_document(path):
+    """Return the text of a .txt/.pdf file, or None for unsupported files."""
+    ext = path.rsplit(".", 1)[-1].lower()
+    if ext == "txt":
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    if ext == "pdf":
+        return extract_text_from_pdf(path)
+    return None
 
+
+def _chunk_documents(folder, fnames):
     texts = []
     metas = []
-
-    if not os.path.exists(folder):
-        raise FileNotFoundError(f"{folder} not found. Create it and add .txt/.pdf files.")
-
-    for fname in sorted(os.listdir(folder)):
+    for fname in fnames:
         path = os.path.join(folder, fname)
         if not os.path.isfile(path):
             continue
-        ext = fname.rsplit(".", 1)[-1].lower()
-        if ext == "txt":
-            with open(path, "r", encoding="utf-8") as f:
-                content = f.read()
-        elif ext == "pdf":
-            content = extract_text_from_pdf(path)
-        else:
+        content = _read_document(path)
+        if content is None:
             # skip other file types
             continue
 
-        # chunk content and store
+        # chunk content and store the full chunk text with its offset, so overlapping
+        # hits from the same source can be merged when the prompt is packed
         chunks = chunk_text(content)
+        pos = 0
         for i, c in enumerate(chunks):
+            start = content.find(c, pos)
+            pos = start + 1
             texts.append(c)
-            metas.append({"source": fname, "chunk": i, "text": c[:400]})
-
-    if not texts:
-        raise ValueError("No .txt or .pdf files found in data/kb_docs/ — add docs before ingestion.")
+            metas.append({"source": fname, "chunk": i, "start": start, "text": c})
+    return texts, metas
 
-    print(f"Creating embeddings for {len(texts)} chunks (calls OpenAI Embeddings API)...")
 
-    # embed in batches
+def _embed_chunks(texts, batch_size):
     all_vecs = []
     for i in range(0, len(texts), batch_size):
         batch = texts[i : i + batch_size]
@@ -80,31 +85,116 @@ def ingest_folder(folder="data/kb_docs", batch_size=16):
         if not isinstance(vecs, (list, tuple)) or len(vecs) != len(batch):
             raise RuntimeError("embed_texts() did not return expected list of embeddings for the batch")
         all_vecs.extend(vecs)
+    return np.array(all_vecs, dtype="float32")
 
-    embeddings = np.array(all_vecs, dtype="float32")
 
-    # save embeddings and metadata
+def _load_index():
+    embeddings = np.load(INDEX_EMBED_PATH)
+    with open(INDEX_META_PATH, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    return embeddings, meta.get("metas", []), meta.get("version")
+
+
+def _save_index(embeddings, metas):
+    # Every rebuild gets a new version so caches derived from the index can be invalidated.
     np.save(INDEX_EMBED_PATH, embeddings)
     with open(INDEX_META_PATH, "w", encoding="utf-8") as f:
-        json.dump({"metas": metas}, f, ensure_ascii=False, indent=2)
+        json.dump({"version": uuid.uuid4().hex, "metas": metas}, f, ensure_ascii=False, indent=2)
+
+
+def _current_index():
+    """Return (embeddings, metas, version) from memory, reloading if the files changed."""
+    if not os.path.exists(INDEX_EMBED_PATH) or not os.path.exists(INDEX_META_PATH):
+        raise FileNotFoundError("Embeddings or metadata not found. Run ingest_folder() before querying.")
+    mtime = os.stat(INDEX_META_PATH).st_mtime_ns
+    if _loaded["mtime"] != mtime:
+        with _INDEX_LOCK:
+            embeddings, metas, version = _load_index()
+        _loaded.update(mtime=mtime, embeddings=embeddings, metas=metas, version=version)
+    return _loaded["embeddings"], _loaded["metas"], _loaded["version"]
+
+
+def index_version():
+    """Version id of the saved index, or None when nothing has been ingested yet."""
+    try:
+        return _current_index()[2]
+    except FileNotFoundError:
+        return None
+
+
+def embed_query(q):
+    return embed_texts([q])[0]
+
+
+def ingest_folder(folder="data/kb_docs", batch_size=16):
+    """
+    Read .txt and .pdf files from `folder`, chunk them, create embeddings using embed_texts(),
+    and save embeddings + metadata to disk.
+    """
+    os.makedirs("data", exist_ok=True)
+
+    if not os.path.exists(folder):
+        raise FileNotFoundError(f"{folder} not found. Create it and add .txt/.pdf files.")
+
+    texts, metas = _chunk_documents(folder, sorted(os.listdir(folder)))
+    if not texts:
+        raise ValueError("No .txt or .pdf files found in data/kb_docs/ — add docs before ingestion.")
+
+    print(f"Creating embeddings for {len(texts)} chunks (calls OpenAI Embeddings API)...")
+    embeddings = _embed_chunks(texts, batch_size)
+
+    # save embeddings and metadata
+    with _INDEX_LOCK:
+        _save_index(embeddings, metas)
 
     print(f"Saved {embeddings.shape[0]} embeddings to {INDEX_EMBED_PATH} and metadata to {INDEX_META_PATH}.")
     return len(texts)
 
 
-def query(q, k=5):
+def ingest_files(fnames, folder="data/kb_docs", batch_size=16):
     """
-    Query the saved embeddings. Returns a list of metadata dicts with 'score' keys.
+    Incrementally add the given files (names relative to `folder`) to the saved index.
+    Only the new documents are embedded; chunks previously indexed under the same
+    source name are replaced. Falls back to a full build when no index exists yet.
     """
-    if not os.path.exists(INDEX_EMBED_PATH) or not os.path.exists(INDEX_META_PATH):
-        raise FileNotFoundError("Embeddings or metadata not found. Run ingest_folder() before querying.")
+    os.makedirs("data", exist_ok=True)
 
-    embeddings = np.load(INDEX_EMBED_PATH)
-    with open(INDEX_META_PATH, "r", encoding="utf-8") as f:
-        metas = json.load(f).get("metas", [])
+    fnames = sorted(set(fnames))
+    texts, metas = _chunk_documents(folder, fnames)
+    if not texts:
+        return 0
+
+    print(f"Creating embeddings for {len(texts)} new chunks from {len(fnames)} file(s)...")
+    new_vecs = _embed_chunks(texts, batch_size)
+
+    with _INDEX_LOCK:
+        if os.path.exists(INDEX_EMBED_PATH) and os.path.exists(INDEX_META_PATH):
+            embeddings, old_metas, _ = _load_index()
+            replaced = set(fnames)
+            keep = [i for i, m in enumerate(old_metas) if m.get("source") not in replaced]
+            if keep:
+                embeddings = np.vstack([embeddings[keep], new_vecs])
+                metas = [old_metas[i] for i in keep] + metas
+            else:
+                embeddings = new_vecs
+        else:
+            embeddings = new_vecs
+        _save_index(embeddings, metas)
+
+    print(f"Index now holds {embeddings.shape[0]} embeddings ({len(texts)} added).")
+    return len(texts)
+
+
+def query(q, k=5, q_vec=None):
+    """
+    Query the saved embeddings. Returns a list of metadata dicts with 'score' keys.
+    Pass `q_vec` to reuse an embedding of `q` that was already computed.
+    """
+    embeddings, metas, _ = _current_index()
 
     # get query vector (embed_texts should return a list)
-    q_vec = embed_texts([q])[0]
+    if q_vec is None:
+        q_vec = embed_query(q)
     sims = cosine_similarity([q_vec], embeddings)[0]
 
     top_idx = sims.argsort()[::-1][:k]
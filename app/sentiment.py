@@ -1,49 +1,385 @@
 from transformers import pipeline
+import hashlib
+import os
+import queue
 import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from app.cache import LRUCache
+from app.lexicon import score_lexicon
+from app.process_pool import RestartingProcessPool
+
+SENTIMENT_MODEL = "distilbert-base-uncased-finetuned-sst-2-english"
+MAX_INPUT_CHARS = 500  # approx. the model's max tokens
+
+# Inference backend: "torch" (full precision), "quantized" (dynamic int8 Linear layers)
+# or "onnx" (ONNX Runtime export via optimum[onnxruntime]).
+SENTIMENT_BACKEND = os.getenv("SENTIMENT_BACKEND", "torch").lower()
+BACKENDS = ("torch", "quantized", "onnx")
+
+# Micro-batching: concurrent callers are gathered for a few ms (or up to N items)
+# and run through the pipeline as one padded forward pass.
+BATCHING_ENABLED = os.getenv("SENTIMENT_BATCHING", "true").lower() not in {"0", "false", "no"}
+BATCH_MAX_SIZE = int(os.getenv("SENTIMENT_BATCH_MAX", "16"))
+BATCH_WAIT_MS = float(os.getenv("SENTIMENT_BATCH_WAIT_MS", "5"))
+INFERENCE_TIMEOUT_S = float(os.getenv("SENTIMENT_TIMEOUT_S", "30"))
+
+# Executor: "thread" runs the model inside the API process; "process" keeps torch in a
+# pool of SENTIMENT_WORKERS spawned processes, each holding the model once.
+SENTIMENT_EXECUTOR = os.getenv("SENTIMENT_EXECUTOR", "thread").lower()
+SENTIMENT_WORKERS = int(os.getenv("SENTIMENT_WORKERS", "2"))
+SENTIMENT_WORKER_THREADS = int(os.getenv("SENTIMENT_WORKER_THREADS", "1"))
+WARMUP_TIMEOUT_S = float(os.getenv("SENTIMENT_WARMUP_TIMEOUT_S", "600"))
+# A failed warmup is retried by the next request after a doubling delay, up to the max.
+WARMUP_RETRY_S = float(os.getenv("SENTIMENT_WARMUP_RETRY_S", "5"))
+WARMUP_RETRY_MAX_S = float(os.getenv("SENTIMENT_WARMUP_RETRY_MAX_S", "300"))
+
+# Cascade: the lexicon scorer answers clear-cut messages; only messages whose net
+# score or polarity purity falls below these thresholds reach the transformer.
+CASCADE_ENABLED = os.getenv("SENTIMENT_CASCADE", "true").lower() not in {"0", "false", "no"}
+LEXICON_MIN_MAGNITUDE = float(os.getenv("SENTIMENT_LEXICON_MIN_MAGNITUDE", "2.0"))
+LEXICON_MIN_PURITY = float(os.getenv("SENTIMENT_LEXICON_MIN_PURITY", "0.75"))
+
+# Results cache keyed by a hash of the normalized, truncated text plus model/backend.
+CACHE_SIZE = int(os.getenv("SENTIMENT_CACHE_SIZE", "4096"))
 
 _sentiment = None
+_cache = LRUCache(CACHE_SIZE)
+
+_stats_lock = threading.Lock()
+_tier_counts = {"lexicon": 0, "transformer": 0, "fallback": 0}
+
+# Background warmup: until the model is loaded and has run once, callers get the
+# keyword fallback instead of waiting on the load.
+_ready = threading.Event()
+_warmup_lock = threading.Lock()
+_warmup_thread = None
+_warmup_error = None
+_warmup_failures = 0
+_next_warmup_at = 0.0
 
 POSITIVE_WORDS = {"happy", "great", "wonderful", "excited", "joyful", "grateful", "good", "amazing", "love", "fantastic"}
 NEGATIVE_WORDS = {"sad", "depressed", "anxious", "afraid", "angry", "hopeless", "terrible", "awful", "hate", "miserable"}
 
 
+def load_pipeline(backend="torch"):
+    """Build a sentiment-analysis pipeline for SENTIMENT_MODEL on the given backend."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown sentiment backend {backend!r}; expected one of {BACKENDS}.")
+    if backend == "torch":
+        return pipeline("sentiment-analysis", model=SENTIMENT_MODEL)
+
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(SENTIMENT_MODEL)
+    if backend == "quantized":
+        import torch
+        from transformers import AutoModelForSequenceClassification
+
+        model = AutoModelForSequenceClassification.from_pretrained(SENTIMENT_MODEL)
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    else:
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+
+        model = ORTModelForSequenceClassification.from_pretrained(SENTIMENT_MODEL, export=True)
+    return pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+
+
 def get_sentiment():
     global _sentiment
     if _sentiment is None:
-        _sentiment = pipeline("sentiment-analysis", model="distilbert-base-uncased-finetuned-sst-2-english")
+        try:
+            _sentiment = load_pipeline(SENTIMENT_BACKEND)
+        except (ImportError, ValueError) as e:
+            if SENTIMENT_BACKEND == "torch":
+                raise
+            print(f"Sentiment backend {SENTIMENT_BACKEND!r} unavailable ({e}); using torch.")
+            _sentiment = load_pipeline("torch")
     return _sentiment
 
 
+def _warm_local():
+    pipe = get_sentiment()
+    pipe("Warming up the sentiment model.")
+    return os.getpid()
+
+
+def _init_worker(torch_threads):
+    """Process-pool initializer: pin torch's intra-op threads and load the model once."""
+    try:
+        import torch
+        torch.set_num_threads(max(1, torch_threads))
+    except Exception:
+        pass
+    _warm_local()
+
+
+def _on_pool_restart():
+    # Fresh workers must load the model again; serve the fallback until they have.
+    global _warmup_thread
+    _ready.clear()
+    with _warmup_lock:
+        _warmup_thread = None
+    start_warmup()
+
+
+_pool = None
+if SENTIMENT_EXECUTOR == "process":
+    _pool = RestartingProcessPool(
+        "sentiment",
+        workers=SENTIMENT_WORKERS,
+        initializer=_init_worker,
+        initargs=(SENTIMENT_WORKER_THREADS,),
+        timeout=INFERENCE_TIMEOUT_S,
+        on_restart=_on_pool_restart,
+    )
+
+
+def _warmup():
+    global _warmup_error, _warmup_thread, _warmup_failures, _next_warmup_at
+    started = time.monotonic()
+    try:
+        if _pool is not None:
+            _pool.warm(os.getpid, timeout=WARMUP_TIMEOUT_S)
+        else:
+            _warm_local()
+    except Exception as e:
+        _warmup_error = f"{type(e).__name__}: {e}"
+        with _warmup_lock:
+            _warmup_failures += 1
+            delay = min(WARMUP_RETRY_MAX_S, WARMUP_RETRY_S * 2 ** (_warmup_failures - 1))
+            _next_warmup_at = time.monotonic() + delay
+            _warmup_thread = None  # let a later start_warmup() try again
+        print(f"Sentiment warmup failed (retry in {delay:.0f}s):", e)
+        return
+    with _warmup_lock:
+        _warmup_failures = 0
+        _next_warmup_at = 0.0
+    _ready.set()
+    _warmup_error = None
+    print(f"Sentiment model ready ({SENTIMENT_BACKEND}, {SENTIMENT_EXECUTOR}) after {time.monotonic() - started:.1f}s.")
+
+
+def start_warmup():
+    """
+    Load and exercise the model in a daemon thread. Safe to call repeatedly; after a
+    failed load it starts a new attempt once the retry delay has passed.
+    """
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is None and time.monotonic() >= _next_warmup_at:
+            _warmup_thread = threading.Thread(target=_warmup, name="sentiment-warmup", daemon=True)
+            _warmup_thread.start()
+
+
+def shutdown() -> None:
+    if _pool is not None:
+        _pool.shutdown()
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def readiness() -> dict:
+    return {
+        "ready": _ready.is_set(),
+        "loading": bool(_warmup_thread and _warmup_thread.is_alive()),
+        "backend": SENTIMENT_BACKEND,
+        "executor": SENTIMENT_EXECUTOR,
+        "error": _warmup_error,
+        "failed_attempts": _warmup_failures,
+    }
+
+
+def _classify_local(texts):
+    """Run one padded forward pass over `texts`; returns one raw pipeline result per text."""
+    pipe = get_sentiment()
+    if len(texts) == 1:
+        return [pipe(texts[0])[0]]
+    return list(pipe(texts, batch_size=len(texts), truncation=True))
+
+
+def _classify_batch(texts):
+    if _pool is not None:
+        return _pool.run(_classify_local, list(texts))
+    return _classify_local(texts)
+
+
+class SentimentBatcher:
+    """
+    Queues single-message requests and serves them from a background thread in batches.
+    With max_in_flight > 1 (one per pool worker) the next batch is gathered while
+    earlier ones are still running.
+    """
+
+    def __init__(self, max_batch=BATCH_MAX_SIZE, max_wait_ms=BATCH_WAIT_MS, max_in_flight=1):
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_in_flight = max(1, int(max_in_flight))
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._dispatch = None
+        if self.max_in_flight > 1:
+            self._dispatch = ThreadPoolExecutor(self.max_in_flight, thread_name_prefix="sentiment-dispatch")
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sentiment-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, text) -> Future:
+        self._ensure_started()
+        fut = Future()
+        self._queue.put((text, fut))
+        return fut
+
+    def classify(self, text, timeout=INFERENCE_TIMEOUT_S):
+        return self.submit(text).result(timeout=timeout)
+
+    def _gather(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _process(self, batch):
+        try:
+            results = _classify_batch([text for text, _ in batch])
+        except Exception as e:
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+        for (_, fut), result in zip(batch, results):
+            fut.set_result(result)
+
+    def _process_and_release(self, batch):
+        try:
+            self._process(batch)
+        finally:
+            self._slots.release()
+
+    def _run(self):
+        while True:
+            if self._dispatch is None:
+                self._process(self._gather())
+                continue
+            # Wait for a free worker first so requests keep accumulating into the next batch.
+            self._slots.acquire()
+            self._dispatch.submit(self._process_and_release, self._gather())
+
+
+_batcher = SentimentBatcher(max_in_flight=SENTIMENT_WORKERS if _pool is not None else 1)
+
+
+def _map_result(result) -> dict:
+    label = result.get("label", "NEUTRAL").upper()
+    score = float(result.get("score", 0.0))
+
+    # Map to more nuanced labels
+    if label == "POSITIVE" and score > 0.9:
+        label = "VERY_POSITIVE"
+    elif label == "NEGATIVE" and score > 0.9:
+        label = "VERY_NEGATIVE"
+    elif score < 0.6:
+        label = "NEUTRAL"
+
+    return {"label": label, "score": score}
+
+
+def _count(tier: str) -> None:
+    with _stats_lock:
+        _tier_counts[tier] += 1
+
+
+def stats() -> dict:
+    with _stats_lock:
+        tiers = dict(_tier_counts)
+    out = {"tiers": tiers, "cache": _cache.stats(), **readiness()}
+    if _pool is not None:
+        out["pool"] = _pool.stats()
+    return out
+
+
+def _lexicon_sentiment(text: str):
+    """First cascade tier: return a result for high-confidence messages, else None."""
+    net, pos, neg = score_lexicon(text)
+    magnitude = abs(net)
+    if magnitude < LEXICON_MIN_MAGNITUDE or magnitude / (pos + neg) < LEXICON_MIN_PURITY:
+        return None
+    label = "POSITIVE" if net > 0 else "NEGATIVE"
+    return _map_result({"label": label, "score": round(min(0.99, 0.6 + 0.1 * magnitude), 2)})
+
+
+def _keyword_sentiment(text: str) -> dict:
+    """Simple fallback: keyword matching."""
+    text_lower = text.lower()
+    words = set(re.findall(r"\w+", text_lower))
+    pos_hits = len(words & POSITIVE_WORDS)
+    neg_hits = len(words & NEGATIVE_WORDS)
+    if neg_hits > pos_hits:
+        return {"label": "NEGATIVE", "score": 0.6}
+    elif pos_hits > neg_hits:
+        return {"label": "POSITIVE", "score": 0.6}
+    return {"label": "NEUTRAL", "score": 0.5}
+
+
+def _cache_key(text: str) -> str:
+    # The model is uncased and whitespace-insensitive, so normalizing widens hits
+    # without changing results.
+    normalized = " ".join(text[:MAX_INPUT_CHARS].lower().split())
+    return hashlib.sha256(f"{SENTIMENT_MODEL}|{SENTIMENT_BACKEND}|{normalized}".encode("utf-8")).hexdigest()
+
+
 def analyze_sentiment(text: str) -> dict:
     if not text or not text.strip():
         return {"label": "NEUTRAL", "score": 0.0}
 
+    key = _cache_key(text)
+    cached = _cache.get(key)
+    if cached is not None:
+        return dict(cached)
+
+    if CASCADE_ENABLED:
+        result = _lexicon_sentiment(text[:MAX_INPUT_CHARS])
+        if result is not None:
+            _count("lexicon")
+            _cache.set(key, result)
+            return dict(result)
+
+    if not _ready.is_set():
+        # Never make a request wait on the model load.
+        start_warmup()
+        _count("fallback")
+        return _keyword_sentiment(text)
+
     try:
-        pipe = get_sentiment()
-        # Truncate to model's max tokens (approx 500 chars is safe)
-        result = pipe(text[:500])[0]
-        label = result.get("label", "NEUTRAL").upper()
-        score = float(result.get("score", 0.0))
-
-        # Map to more nuanced labels
-        if label == "POSITIVE" and score > 0.9:
-            label = "VERY_POSITIVE"
-        elif label == "NEGATIVE" and score > 0.9:
-            label = "VERY_NEGATIVE"
-        elif score < 0.6:
-            label = "NEUTRAL"
-
-        return {"label": label, "score": score}
+        if BATCHING_ENABLED:
+            result = _batcher.classify(text[:MAX_INPUT_CHARS])
+        else:
+            result = _classify_batch([text[:MAX_INPUT_CHARS]])[0]
+        _count("transformer")
+        result = _map_result(result)
+        # Fallback results are never cached, so they are replaced once the model is up.
+        _cache.set(key, result)
+        return dict(result)
 
     except Exception as e:
         print("Sentiment analysis error:", e)
-        # Simple fallback: keyword matching
-        text_lower = text.lower()
-        words = set(re.findall(r"\w+", text_lower))
-        pos_hits = len(words & POSITIVE_WORDS)
-        neg_hits = len(words & NEGATIVE_WORDS)
-        if neg_hits > pos_hits:
-            return {"label": "NEGATIVE", "score": 0.6}
-        elif pos_hits > neg_hits:
-            return {"label": "POSITIVE", "score": 0.6}
-        return {"label": "NEUTRAL", "score": 0.5}
\ No newline at end of file
+        _count("fallback")
+        return _keyword_sentiment(text)
@@ -0,0 +1,81 @@
+# app/singleflight.py  (coalesce identical in-flight upstream calls)
+import asyncio
+import threading
+from concurrent.futures import Future
+
+_registry = {}
+
+
+class SingleFlight:
+    """
+    Concurrent calls that share a key run the underlying function once; every caller
+    receives that call's result (or exception). Nothing is cached after it completes.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+        self.executions = 0
+        self.shared = 0
+        _registry[name] = self
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            fut = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._calls[key] = Future()
+                self.executions += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return fut.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def do_async(self, key, coro_fn, *args, **kwargs):
+        # The shared call runs as its own task, so a caller that is cancelled (e.g. the
+        # client disconnected) does not cancel it for the others.
+        loop = asyncio.get_running_loop()
+        task_key = (id(loop), key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = loop.create_task(coro_fn(*args, **kwargs))
+                self._tasks[task_key] = task
+                task.add_done_callback(lambda t: self._finish(task_key, t))
+                self.executions += 1
+            else:
+                self.shared += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, task_key, task):
+        with self._lock:
+            self._tasks.pop(task_key, None)
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter went away
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.executions + self.shared,
+                "upstream_calls": self.executions,
+                "saved_calls": self.shared,
+                "in_flight": len(self._calls) + len(self._tasks),
+            }
+
+
+def stats() -> dict:
+    return {name: flight.stats() for name, flight in _registry.items()}
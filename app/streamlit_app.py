@@ -8,12 +8,13 @@ if ROOT not in sys.path:
 # ---------------------------------------------------------------------
 
 import traceback
+from datetime import datetime
 import streamlit as st
 from dotenv import load_dotenv
 load_dotenv()
 
 # app internals
-from app.db import init_db, SessionLocal, User, Conversation, Message
+from app.db import init_db, SessionLocal, User, Conversation, Message, touch_conversation
 from app.sentiment import analyze_sentiment
 from app.api_client import ask_mental, ask_legal
 
@@ -141,8 +142,9 @@ if send_clicked and user_msg.strip():
         st.session_state.conversation_id = conv.id
 
     # Save user message ONCE
-    user_message_obj = Message(conversation_id=conv.id, sender="user", text=user_msg, sentiment=None)
+    user_message_obj = Message(conversation_id=conv.id, sender="user", text=user_msg, sentiment=None, created_at=datetime.utcnow())
     db.add(user_message_obj)
+    touch_conversation(db, conv.id, user_msg, user_message_obj.created_at)
     db.commit()
     db.refresh(user_message_obj)
 
@@ -171,8 +173,9 @@ if send_clicked and user_msg.strip():
             sources = []
 
         # Save assistant reply ONCE
-        bot_message_obj = Message(conversation_id=conv.id, sender="bot", text=reply, sentiment=(sentiment if section == "Mental Health" else None))
+        bot_message_obj = Message(conversation_id=conv.id, sender="bot", text=reply, sentiment=(sentiment if section == "Mental Health" else None), created_at=datetime.utcnow())
         db.add(bot_message_obj)
+        touch_conversation(db, conv.id, reply, bot_message_obj.created_at)
         db.commit()
         db.refresh(bot_message_obj)
 
@@ -0,0 +1,214 @@
+# app/write_behind.py  (optional batched write-behind for chat messages)
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from app.db import Message, SessionLocal, touch_conversation
+
+MESSAGE_WRITE_BEHIND = os.getenv("MESSAGE_WRITE_BEHIND", "false").lower() in {"1", "true", "yes"}
+WRITE_BEHIND_BATCH = int(os.getenv("WRITE_BEHIND_BATCH", "50"))
+WRITE_BEHIND_INTERVAL_MS = float(os.getenv("WRITE_BEHIND_INTERVAL_MS", "200"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "5000"))
+WRITE_BEHIND_RETRY_S = float(os.getenv("WRITE_BEHIND_RETRY_S", "1.0"))
+
+
+class MessageWriter:
+    """
+    Queues Message rows and bulk-inserts them from a background thread, in batches of
+    up to `batch_size` or every `interval_ms`.
+
+    Guarantees: queued rows are inserted in enqueue order; a failed batch is retried
+    (never dropped) except for rows the database rejects outright, which are logged;
+    when `max_pending` rows are waiting, callers block briefly for room and then write
+    synchronously rather than grow the queue; close() drains everything. A hard crash
+    can lose at most the rows of the last interval. Pending rows stay visible through
+    pending() until stored.
+    """
+
+    def __init__(
+        self,
+        batch_size=WRITE_BEHIND_BATCH,
+        interval_ms=WRITE_BEHIND_INTERVAL_MS,
+        max_pending=WRITE_BEHIND_MAX_PENDING,
+        retry_s=WRITE_BEHIND_RETRY_S,
+        session_factory=SessionLocal,
+    ):
+        self.batch_size = max(1, batch_size)
+        self.interval = interval_ms / 1000.0
+        self.max_pending = max(1, max_pending)
+        self.retry_s = retry_s
+        self._session_factory = session_factory
+        self._rows = deque()
+        self._by_conversation = defaultdict(list)
+        self._cond = threading.Condition()
+        self._closing = False
+        self._thread = None
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.rejected = 0
+        self.synchronous = 0
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, conversation_id, sender, text, sentiment=None, is_crisis=False) -> None:
+        row = {
+            "conversation_id": conversation_id,
+            "sender": sender,
+            "text": text,
+            "sentiment": sentiment,
+            "is_crisis": is_crisis,
+            "created_at": datetime.utcnow(),
+        }
+        with self._cond:
+            if len(self._rows) >= self.max_pending and not self._closing:
+                self._cond.notify_all()
+                self._cond.wait_for(lambda: len(self._rows) < self.max_pending, timeout=self.retry_s)
+            if len(self._rows) < self.max_pending and not self._closing:
+                self._rows.append(row)
+                self._by_conversation[conversation_id].append(row)
+                self.enqueued += 1
+                self._ensure_thread()
+                if len(self._rows) >= self.batch_size:
+                    self._cond.notify_all()
+                return
+            self.synchronous += 1
+        self._insert([row])  # the queue stayed full (or is closing): write in the caller
+
+    def pending(self, conversation_id) -> list:
+        """Rows for `conversation_id` that are queued but not yet stored, oldest first."""
+        with self._cond:
+            return list(self._by_conversation.get(conversation_id, ()))
+
+    def wait_for(self, conversation_id, timeout=5.0) -> bool:
+        """Block until the conversation's queued rows are stored (read-your-writes)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._by_conversation.get(conversation_id):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def flush(self, timeout=10.0) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=10.0) -> bool:
+        """Stop accepting rows into the queue and store everything already queued."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._cond:
+            return not self._rows
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._rows and self._closing:
+                    return
+                if len(self._rows) < self.batch_size and not self._closing:
+                    self._cond.wait(self.interval)
+                batch = [self._rows[i] for i in range(min(self.batch_size, len(self._rows)))]
+            if not batch:
+                continue
+            try:
+                self._insert(batch)
+            except Exception as e:
+                self.failures += 1
+                print(f"Message write-behind batch of {len(batch)} failed, retrying:", e)
+                time.sleep(self.retry_s)
+                continue
+            with self._cond:
+                for row in batch:
+                    self._rows.popleft()
+                    rows = self._by_conversation.get(row["conversation_id"])
+                    if rows:
+                        rows.remove(row)
+                        if not rows:
+                            del self._by_conversation[row["conversation_id"]]
+                self._cond.notify_all()
+
+    def _insert(self, rows) -> None:
+        """
+        Store `rows` in one transaction, so a failed attempt stores nothing and the
+        caller can retry the whole batch without duplicating rows.
+        """
+        db = self._session_factory()
+        try:
+            stored = rows
+            try:
+                db.execute(insert(Message), rows)
+                _touch_conversations(db, rows)
+                db.commit()
+            except IntegrityError:
+                # One bad row (e.g. its conversation was deleted) must not block the rest:
+                # find it with rolled-back trial inserts, then commit the others together.
+                db.rollback()
+                stored = []
+                for row in rows:
+                    try:
+                        db.execute(insert(Message), [row])
+                        stored.append(row)
+                    except IntegrityError as e:
+                        print("Message write-behind dropped a row the database rejected:", e)
+                    finally:
+                        db.rollback()
+                if stored:
+                    db.execute(insert(Message), stored)
+                    _touch_conversations(db, stored)
+                    db.commit()
+                self.rejected += len(rows) - len(stored)
+            self.written += len(stored)
+            self.batches += 1
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "enabled": MESSAGE_WRITE_BEHIND,
+                "pending": len(self._rows),
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "batches": self.batches,
+                "failed_batches": self.failures,
+                "rejected_rows": self.rejected,
+                "synchronous_writes": self.synchronous,
+            }
+
+
+def _touch_conversations(db, rows) -> None:
+    # One list-column update per conversation in the batch, in the insert's transaction.
+    newest, counts = {}, defaultdict(int)
+    for row in rows:
+        newest[row["conversation_id"]] = row
+        counts[row["conversation_id"]] += 1
+    for conv_id, row in newest.items():
+        touch_conversation(db, conv_id, row["text"], row["created_at"], counts[conv_id])
+
+
+message_writer = MessageWriter()
@@ -0,0 +1,98 @@
+"""
+Simulate chat overload against a quota-limited model, with and without admission control.
+
+The fake upstream serves `capacity` calls at once at `base_latency`; beyond that each
+extra in-flight call adds latency, and calls beyond twice the capacity get a 429.
+Requests arrive as a Poisson stream at `--rate` per second. Goodput counts replies
+that succeeded within the SLO; shed requests (503) fail fast instead of piling up.
+
+Usage:
+    python -m benchmarks.bench_admission
+    python -m benchmarks.bench_admission --rates 10 40 80 --duration 5
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from app.admission import AdaptiveLimiter, Overloaded
+
+
+class FakeUpstream:
+    def __init__(self, capacity, base_latency):
+        self.capacity = capacity
+        self.base_latency = base_latency
+        self.in_flight = 0
+
+    async def call(self):
+        self.in_flight += 1
+        try:
+            if self.in_flight > 2 * self.capacity:
+                await asyncio.sleep(0.05)
+                return False  # 429
+            excess = max(0, self.in_flight - self.capacity)
+            await asyncio.sleep(self.base_latency * (1 + excess / self.capacity))
+            return True
+        finally:
+            self.in_flight -= 1
+
+
+async def _run(rate, duration, slo, capacity, base_latency, limited):
+    upstream = FakeUpstream(capacity, base_latency)
+    limiter = AdaptiveLimiter(
+        "bench", initial=capacity, max_limit=4 * capacity, queue_size=capacity,
+        queue_timeout=slo / 2, latency_target=slo / 2,
+    )
+    results = {"ok": 0, "slow": 0, "failed": 0, "shed": 0}
+
+    async def request():
+        start = time.monotonic()
+        admitted = None
+        if limited:
+            try:
+                admitted = await limiter.acquire()
+            except Overloaded:
+                results["shed"] += 1
+                return
+        ok = await upstream.call()
+        if admitted is not None:
+            limiter.release(admitted, congested=not ok)
+        if not ok:
+            results["failed"] += 1
+        elif time.monotonic() - start > slo:
+            results["slow"] += 1
+        else:
+            results["ok"] += 1
+
+    tasks = []
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        tasks.append(asyncio.ensure_future(request()))
+        await asyncio.sleep(random.expovariate(rate))
+    await asyncio.gather(*tasks)
+    results["goodput_per_s"] = round(results["ok"] / duration, 1)
+    results["final_limit"] = round(limiter.limit, 1) if limited else None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rates", type=float, nargs="+", default=[10, 20, 40, 80])
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--slo", type=float, default=2.0, help="seconds a reply may take and still count")
+    parser.add_argument("--capacity", type=int, default=8)
+    parser.add_argument("--base-latency", type=float, default=0.4)
+    args = parser.parse_args()
+
+    print(f"{'rate/s':>7} {'mode':>9} {'goodput/s':>10} {'ok':>6} {'slow':>6} {'429':>6} {'shed':>6} {'limit':>6}")
+    for rate in args.rates:
+        for limited in (False, True):
+            r = asyncio.run(_run(rate, args.duration, args.slo, args.capacity, args.base_latency, limited))
+            print(
+                f"{rate:>7.0f} {'limited' if limited else 'unlimited':>9} {r['goodput_per_s']:>10} "
+                f"{r['ok']:>6} {r['slow']:>6} {r['failed']:>6} {r['shed']:>6} {str(r['final_limit']):>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
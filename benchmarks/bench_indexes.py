@@ -0,0 +1,183 @@
+"""
+Measure the hot-path queries against a large seeded database, without and with the
+composite indexes from migrations 0005 and 0006.
+
+Builds the schema from the models in a scratch database, drops the hot-path indexes,
+seeds `--messages` messages spread over `--conversations` conversations and `--users`
+users, times each query, then creates the indexes and times them again. Pass a
+PostgreSQL URL with --url to use Postgres instead of a temporary SQLite file (the
+tables are dropped when the run ends).
+
+Usage:
+    python -m benchmarks.bench_indexes
+    python -m benchmarks.bench_indexes --messages 5000000 --runs 100
+    python -m benchmarks.bench_indexes --url postgresql://bench@localhost/bench_scratch
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, create_engine, insert, select, update
+
+from app.db import AuthUser, Base, Conversation, Message, RateLimit, User
+from app.rate_limit import DatabaseRateLimiter
+
+HOT_PATH_INDEXES = [
+    (Message.__table__, "ix_messages_conversation_id_id"),
+    (Conversation.__table__, "ix_conversations_user_id_last_message_at"),
+]
+CHUNK = 20000
+
+
+def _index(table, name):
+    return next(ix for ix in table.indexes if ix.name == name)
+
+
+def _seed(engine, users, conversations, messages):
+    start = datetime.utcnow() - timedelta(days=365)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": i, "email": f"bench{i}@example.com"} for i in range(1, users + 1)])
+        conn.execute(insert(AuthUser), [
+            {"id": i, "user_id": i, "full_name": f"Bench {i}", "phone": f"{i:010d}",
+             "email": f"bench{i}@example.com", "password_hash": "-", "password_salt": "-"}
+            for i in range(1, users + 1)
+        ])
+        conn.execute(insert(RateLimit), [
+            {"auth_user_id": i, "window_start": start, "request_count": 0} for i in range(1, users + 1)
+        ])
+        for lo in range(1, conversations + 1, CHUNK):
+            conn.execute(insert(Conversation), [
+                {"id": c, "user_id": random.randint(1, users), "section": "mental",
+                 "title": f"Conversation {c}", "created_at": start + timedelta(seconds=c),
+                 "last_message_at": start + timedelta(seconds=c)}
+                for c in range(lo, min(conversations, lo + CHUNK - 1) + 1)
+            ])
+    # Interleave conversations like real traffic, so one conversation's rows are scattered.
+    activity, counts = {}, {}
+    done = 0
+    while done < messages:
+        n = min(CHUNK, messages - done)
+        rows = [
+            {"conversation_id": random.randint(1, conversations), "sender": "user" if i % 2 else "bot",
+             "text": "How are you feeling today? " * 4, "created_at": start + timedelta(seconds=done + i)}
+            for i in range(n)
+        ]
+        for row in rows:  # rows are in time order, so the last one seen is the newest
+            activity[row["conversation_id"]] = row["created_at"]
+            counts[row["conversation_id"]] = counts.get(row["conversation_id"], 0) + 1
+        with engine.begin() as conn:
+            conn.execute(insert(Message), rows)
+        done += n
+        print(f"  seeded {done:,}/{messages:,} messages", end="\r", flush=True)
+    print()
+    # The list columns touch_conversation() would have kept current.
+    touched = sorted(activity)
+    for lo in range(0, len(touched), CHUNK):
+        with engine.begin() as conn:
+            conn.execute(
+                update(Conversation)
+                .where(Conversation.id == bindparam("conv_id"))
+                .values(last_message_at=bindparam("at"), message_count=bindparam("count")),
+                [{"conv_id": c, "at": activity[c], "count": counts[c]} for c in touched[lo:lo + CHUNK]],
+            )
+
+
+def _timed(engine, runs, run_once):
+    samples = []
+    with engine.connect() as conn:
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            run_once(conn)
+            samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    return statistics.median(samples), samples[int(0.95 * (len(samples) - 1))]
+
+
+def _queries(users, conversations):
+    history = (
+        select(Message.sender, Message.text)
+        .where(Message.conversation_id == bindparam("conv_id"), Message.id > 0)
+        .order_by(Message.id.desc())
+        .limit(6)
+    )
+    listing = (
+        select(Conversation.id, Conversation.title, Conversation.last_message_at)
+        .where(Conversation.user_id == bindparam("user_id"))
+        .order_by(Conversation.last_message_at.desc(), Conversation.id.desc())
+        .limit(50)
+    )
+    limiter = DatabaseRateLimiter()
+
+    def load_history(conn):
+        conn.execute(history, {"conv_id": random.randint(1, conversations)}).all()
+
+    def list_conversations(conn):
+        conn.execute(listing, {"user_id": random.randint(1, users)}).all()
+
+    def rate_limit_hit(conn):
+        with conn.begin() as tx:
+            limiter.hit(random.randint(1, users), conn)
+            tx.rollback()
+
+    return [
+        ("history (last 6 in conversation)", load_history),
+        ("conversation list (user, latest 50)", list_conversations),
+        ("rate limit upsert", rate_limit_hit),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="database to use (default: a temporary SQLite file)")
+    parser.add_argument("--messages", type=int, default=2_000_000)
+    parser.add_argument("--conversations", type=int, default=50_000)
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    tmpdir = None
+    url = args.url
+    if not url:
+        tmpdir = tempfile.mkdtemp(prefix="lumen-bench-")
+        url = f"sqlite:///{os.path.join(tmpdir, 'bench.sqlite')}"
+    engine = create_engine(url)
+    random.seed(7)
+
+    try:
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+        for table, name in HOT_PATH_INDEXES:
+            _index(table, name).drop(engine)
+        print(f"Seeding {args.messages:,} messages, {args.conversations:,} conversations, {args.users:,} users ...")
+        t0 = time.perf_counter()
+        _seed(engine, args.users, args.conversations, args.messages)
+        print(f"Seeded in {time.perf_counter() - t0:.1f}s")
+
+        queries = _queries(args.users, args.conversations)
+        before = {label: _timed(engine, args.runs, fn) for label, fn in queries}
+        t0 = time.perf_counter()
+        for table, name in HOT_PATH_INDEXES:
+            _index(table, name).create(engine)
+        print(f"Built indexes in {time.perf_counter() - t0:.1f}s")
+        after = {label: _timed(engine, args.runs, fn) for label, fn in queries}
+
+        print(f"\n{'query':<38} {'before p50':>11} {'p95':>9} {'after p50':>10} {'p95':>9} {'speedup':>8}")
+        for label, _ in queries:
+            (b50, b95), (a50, a95) = before[label], after[label]
+            print(f"{label:<38} {b50:>9.2f}ms {b95:>7.2f}ms {a50:>8.2f}ms {a95:>7.2f}ms {b50 / max(a50, 1e-6):>7.1f}x")
+    finally:
+        if args.url:
+            Base.metadata.drop_all(engine)
+        engine.dispose()
+        if tmpdir:
+            for name in os.listdir(tmpdir):
+                os.remove(os.path.join(tmpdir, name))
+            os.rmdir(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Measure login (PBKDF2 verify) throughput per core and what a login burst does to
+chat-side latency.
+
+For each worker count, fires `--logins` verifications through the same fixed cap the
+API uses, either in a process pool (PASSWORD_EXECUTOR=process) or in threads, while a
+probe stands in for chat traffic: every 10ms it hops to the default thread pool and
+does a little JSON work, as a chat request does for its database calls. Reports
+logins/s, logins/s per worker, and the probe's p50/p95 against an idle baseline.
+
+Usage:
+    python -m benchmarks.bench_passwords
+    python -m benchmarks.bench_passwords --workers 1 2 4 --logins 400
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.admission import AdaptiveLimiter
+from app.passwords import hash_password, verify_password
+from app.process_pool import RestartingProcessPool
+
+SALT = "bench-salt"
+PAYLOAD = [{"sender": "user", "text": "How are you feeling today?" * 3, "id": i} for i in range(50)]
+
+
+def _chat_work():
+    return len(json.dumps(PAYLOAD))
+
+
+async def _probe(stop, samples):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await loop.run_in_executor(None, _chat_work)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+        await asyncio.sleep(0.01)
+
+
+async def _run(mode, workers, logins, expected):
+    loop = asyncio.get_running_loop()
+    limiter = AdaptiveLimiter(
+        "bench", initial=2 * workers, min_limit=2 * workers, max_limit=2 * workers,
+        queue_size=logins, queue_timeout=3600, latency_target=3600,
+    )
+    pool = threads = None
+    if mode == "process":
+        pool = RestartingProcessPool("bench-passwords", workers=workers, timeout=60)
+        pool.warm(os.getpid, timeout=60)
+    elif mode == "thread":
+        threads = ThreadPoolExecutor(max_workers=workers)
+
+    async def login():
+        started = await limiter.acquire()
+        try:
+            if pool is not None:
+                ok = await pool.run_async(verify_password, "Password123", SALT, expected)
+            else:
+                ok = await loop.run_in_executor(threads, verify_password, "Password123", SALT, expected)
+            assert ok
+        finally:
+            limiter.release(started)
+
+    samples, stop = [], asyncio.Event()
+    probe = asyncio.ensure_future(_probe(stop, samples))
+    t0 = time.perf_counter()
+    if mode == "idle":
+        await asyncio.sleep(1.0)
+    else:
+        await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await probe
+    if pool is not None:
+        pool.shutdown()
+    if threads is not None:
+        threads.shutdown()
+    samples.sort()
+    return {
+        "logins_per_s": 0.0 if mode == "idle" else logins / elapsed,
+        "probe_p50": statistics.median(samples),
+        "probe_p95": samples[int(0.95 * (len(samples) - 1))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, 2, os.cpu_count() or 1}))
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--modes", nargs="+", default=["thread", "process"], choices=["thread", "process"])
+    args = parser.parse_args()
+
+    expected = hash_password("Password123", SALT)
+    t0 = time.perf_counter()
+    for _ in range(20):
+        hash_password("Password123", SALT)
+    single = 20 / (time.perf_counter() - t0)
+    print(f"CPUs: {os.cpu_count()}   one hash inline: {1000 / single:.1f}ms ({single:.1f}/s on one core)")
+
+    idle = asyncio.run(_run("idle", 1, 0, expected))
+    print(f"Chat probe idle: p50 {idle['probe_p50']:.2f}ms  p95 {idle['probe_p95']:.2f}ms\n")
+    print(f"{'mode':>8} {'workers':>8} {'logins/s':>9} {'per core':>9} {'probe p50':>10} {'probe p95':>10}")
+    for workers in args.workers:
+        for mode in args.modes:
+            r = asyncio.run(_run(mode, workers, args.logins, expected))
+            per_core = r["logins_per_s"] / min(workers, os.cpu_count() or 1)
+            print(
+                f"{mode:>8} {workers:>8} {r['logins_per_s']:>9.1f} {per_core:>9.1f} "
+                f"{r['probe_p50']:>8.2f}ms {r['probe_p95']:>8.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark the sentiment inference backends (torch / quantized / onnx).
+
+Each backend is loaded in its own process so resident memory is measured cleanly.
+Reports load time, RSS growth, single-message latency (p50/p95), batched throughput
+and label agreement with the full-precision torch pipeline.
+
+Usage:
+    python -m benchmarks.bench_sentiment
+    python -m benchmarks.bench_sentiment --backends torch quantized --runs 200
+"""
+import argparse
+import multiprocessing as mp
+import statistics
+import time
+
+SAMPLES = [
+    "I feel so alone and nobody seems to care about me.",
+    "Today was a really good day, I finally finished my project!",
+    "I can't sleep, my mind keeps racing about work.",
+    "My therapist said I'm making progress and I feel hopeful.",
+    "Everything is falling apart and I don't know what to do.",
+    "I'm grateful for my friends, they always support me.",
+    "I'm anxious about my exams next week.",
+    "I had a calm walk in the park this morning.",
+    "I hate how tired I feel all the time.",
+    "Talking to you helps, thank you.",
+]
+
+
+def _rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+def _bench_backend(backend, runs, batch_size):
+    from app.sentiment import load_pipeline
+
+    rss_before = _rss_mb()
+    t0 = time.perf_counter()
+    pipe = load_pipeline(backend)
+    pipe(SAMPLES[0])  # first call initialises kernels / sessions
+    load_s = time.perf_counter() - t0
+    rss_after = _rss_mb()
+
+    latencies = []
+    for i in range(runs):
+        text = SAMPLES[i % len(SAMPLES)]
+        t = time.perf_counter()
+        pipe(text)
+        latencies.append((time.perf_counter() - t) * 1000)
+    latencies.sort()
+
+    batch = (SAMPLES * (batch_size // len(SAMPLES) + 1))[:batch_size]
+    t = time.perf_counter()
+    for _ in range(max(1, runs // batch_size)):
+        pipe(batch, batch_size=batch_size, truncation=True)
+    elapsed = time.perf_counter() - t
+    throughput = max(1, runs // batch_size) * batch_size / elapsed
+
+    labels = [r["label"] for r in pipe(SAMPLES)]
+    return {
+        "backend": backend,
+        "load_s": load_s,
+        "rss_mb": rss_after - rss_before,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "throughput": throughput,
+        "labels": labels,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "quantized", "onnx"])
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    results = []
+    for backend in args.backends:
+        with ctx.Pool(1) as pool:
+            try:
+                results.append(pool.apply(_bench_backend, (backend, args.runs, args.batch_size)))
+            except Exception as e:
+                print(f"[{backend}] skipped: {e}")
+
+    if not results:
+        return
+    reference = next((r["labels"] for r in results if r["backend"] == "torch"), results[0]["labels"])
+    print(f"{'backend':<10} {'load s':>7} {'RSS MB':>8} {'p50 ms':>8} {'p95 ms':>8} {'msg/s':>8} {'agree':>6}")
+    for r in results:
+        agree = sum(a == b for a, b in zip(r["labels"], reference)) / len(reference)
+        print(
+            f"{r['backend']:<10} {r['load_s']:>7.1f} {r['rss_mb']:>8.0f} {r['p50_ms']:>8.1f} "
+            f"{r['p95_ms']:>8.1f} {r['throughput']:>8.1f} {agree:>6.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
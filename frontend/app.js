@@ -78,6 +78,9 @@ let authToken      = null;
 let conversationId = null;
 let currentMode    = "mental";
 let conversations  = [];
+let convCursor     = null;   // next_cursor for older conversations, null when all loaded
+let olderCursor    = null;   // next_cursor for older messages in the open conversation
+let pageLoading    = false;
 let sourcesOpen    = false;
 
 // ─── Auth helpers ─────────────────────────────────────────────────────────────
@@ -92,6 +95,8 @@ function clearSession() {
   authToken = null;
   conversationId = null;
   conversations  = [];
+  convCursor     = null;
+  olderCursor    = null;
   sessionStorage.removeItem(STORAGE_KEY);
 }
 
@@ -247,12 +252,8 @@ function renderMarkdown(text) {
   return div;
 }
 
-// ─── Append message bubble ────────────────────────────────────────────────────
-function appendMessage(sender, text, options = {}) {
-  // Remove welcome state if present
-  const welcome = messagesEl.querySelector(".welcome-state");
-  if (welcome) welcome.remove();
-
+// ─── Message bubbles ──────────────────────────────────────────────────────────
+function buildMessage(sender, text, options = {}) {
   const wrapper = document.createElement("div");
   wrapper.className = "bubble-wrapper";
   wrapper.style.display = "flex";
@@ -283,11 +284,31 @@ function appendMessage(sender, text, options = {}) {
     wrapper.appendChild(badge);
   }
 
+  return { wrapper, bubble };
+}
+
+function appendMessage(sender, text, options = {}) {
+  // Remove welcome state if present
+  const welcome = messagesEl.querySelector(".welcome-state");
+  if (welcome) welcome.remove();
+
+  const { wrapper, bubble } = buildMessage(sender, text, options);
   messagesEl.appendChild(wrapper);
   messagesEl.scrollTop = messagesEl.scrollHeight;
   return bubble;
 }
 
+// Insert an older page above the current messages without moving what is on screen.
+function prependMessages(messages) {
+  const fragment = document.createDocumentFragment();
+  messages.forEach((m) => {
+    fragment.appendChild(buildMessage(m.sender, m.text, { sentiment: m.sentiment, crisis: m.is_crisis }).wrapper);
+  });
+  const fromBottom = messagesEl.scrollHeight - messagesEl.scrollTop;
+  messagesEl.insertBefore(fragment, messagesEl.firstChild);
+  messagesEl.scrollTop = messagesEl.scrollHeight - fromBottom;
+}
+
 // ─── Typing indicator ─────────────────────────────────────────────────────────
 function showTyping() {
   const el = document.createElement("div");
@@ -405,12 +426,44 @@ async function loadConversations() {
     if (!res.ok) return;
     const data = await res.json();
     conversations = data.conversations || [];
+    convCursor = data.next_cursor ?? null;
     renderConvList();
   } catch {
     // silently fail
   }
 }
 
+async function loadMoreConversations() {
+  if (!authToken || convCursor === null || pageLoading) return;
+  pageLoading = true;
+  try {
+    const res = await fetch(`/api/conversations?before=${convCursor}`, { headers: authHeaders() });
+    if (!res.ok) return;
+    const data = await res.json();
+    const known = new Set(conversations.map((c) => c.id));
+    conversations = conversations.concat((data.conversations || []).filter((c) => !known.has(c.id)));
+    convCursor = data.next_cursor ?? null;
+    renderConvList();
+  } catch {
+    // silently fail
+  } finally {
+    pageLoading = false;
+  }
+}
+
+// Server timestamps are naive UTC ("2025-01-31 09:15:02.123456").
+function formatActivity(stamp) {
+  if (!stamp) return "";
+  const then = new Date(stamp.replace(" ", "T").slice(0, 23) + "Z");
+  if (isNaN(then)) return "";
+  const minutes = Math.floor((Date.now() - then.getTime()) / 60000);
+  if (minutes < 1) return "just now";
+  if (minutes < 60) return `${minutes}m ago`;
+  if (minutes < 24 * 60) return `${Math.floor(minutes / 60)}h ago`;
+  if (minutes < 7 * 24 * 60) return `${Math.floor(minutes / (24 * 60))}d ago`;
+  return then.toLocaleDateString();
+}
+
 function renderConvList() {
   convList.innerHTML = "";
   if (!conversations.length) {
@@ -430,10 +483,29 @@ function renderConvList() {
     icon.className = "conv-icon";
     icon.textContent = conv.section === "mental" ? "🧠" : "⚖️";
 
+    const body = document.createElement("div");
+    body.className = "conv-body";
+
     const title = document.createElement("span");
     title.className = "conv-title";
     title.textContent = conv.title || `Conversation #${conv.id}`;
     title.title = conv.title || `Conversation #${conv.id}`;
+    body.appendChild(title);
+
+    if (conv.last_message_preview) {
+      const preview = document.createElement("span");
+      preview.className = "conv-preview";
+      preview.textContent = conv.last_message_preview;
+      body.appendChild(preview);
+    }
+
+    const meta = document.createElement("span");
+    meta.className = "conv-meta";
+    const count = conv.message_count || 0;
+    meta.textContent = [formatActivity(conv.last_activity), `${count} message${count === 1 ? "" : "s"}`]
+      .filter(Boolean)
+      .join(" · ");
+    body.appendChild(meta);
 
     const delBtn = document.createElement("button");
     delBtn.className = "conv-delete";
@@ -445,7 +517,7 @@ function renderConvList() {
     });
 
     item.appendChild(icon);
-    item.appendChild(title);
+    item.appendChild(body);
     item.appendChild(delBtn);
 
     item.addEventListener("click", () => loadConversation(conv.id, conv.section));
@@ -463,6 +535,7 @@ async function loadConversation(id, section) {
     // Set mode
     setMode(data.mode || section || "mental");
     conversationId = id;
+    olderCursor = data.next_cursor ?? null;
 
     // Clear and replay messages
     messagesEl.innerHTML = "";
@@ -476,11 +549,31 @@ async function loadConversation(id, section) {
     });
 
     renderConvList();
+    // A short first page leaves nothing to scroll; fetch the next one straight away.
+    if (messagesEl.scrollHeight <= messagesEl.clientHeight) loadOlderMessages();
   } catch (err) {
     toast("Could not load conversation", "error");
   }
 }
 
+async function loadOlderMessages() {
+  if (!authToken || conversationId === null || olderCursor === null || pageLoading) return;
+  const id = conversationId;
+  pageLoading = true;
+  try {
+    const res = await fetch(`/api/conversations/${id}/messages?before=${olderCursor}`, { headers: authHeaders() });
+    if (!res.ok) throw new Error("Failed to load older messages");
+    const data = await res.json();
+    if (id !== conversationId) return;  // switched conversations meanwhile
+    prependMessages(data.messages);
+    olderCursor = data.next_cursor ?? null;
+  } catch {
+    toast("Could not load older messages", "error");
+  } finally {
+    pageLoading = false;
+  }
+}
+
 async function deleteConversation(id) {
   if (!authToken) return;
   try {
@@ -502,16 +595,40 @@ async function deleteConversation(id) {
 }
 
 // ─── Chat ─────────────────────────────────────────────────────────────────────
+// Parse a text/event-stream response body into { event, data } objects as they arrive.
+async function* readEvents(res) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const block = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      let event = "message";
+      let data = "";
+      block.split("\n").forEach((line) => {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      });
+      if (data) yield { event, data: JSON.parse(data) };
+    }
+  }
+}
+
 async function sendMessage(message) {
   sendBtn.disabled = true;
   promptEl.disabled = true;
   appendMessage("user", message);
   renderSources([]);
 
-  const typingEl = showTyping();
+  showTyping();
 
   try {
-    const res = await fetch("/api/chat", {
+    const res = await fetch("/api/chat/stream", {
       method: "POST",
       headers: authHeaders(),
       body: JSON.stringify({
@@ -521,15 +638,14 @@ async function sendMessage(message) {
       }),
     });
 
-    const data = await res.json();
-    removeTyping();
-
-    if (res.status === 429) {
-      toast(data.detail || "Rate limit reached. Please wait.", "warning");
-      appendMessage("bot", data.detail || "Too many messages. Please slow down.");
-      return;
-    }
     if (!res.ok) {
+      const data = await res.json();
+      removeTyping();
+      if (res.status === 429) {
+        toast(data.detail || "Rate limit reached. Please wait.", "warning");
+        appendMessage("bot", data.detail || "Too many messages. Please slow down.");
+        return;
+      }
       if (res.status === 401) {
         toast("Session expired. Please sign in again.", "error");
         signOut();
@@ -538,15 +654,34 @@ async function sendMessage(message) {
       throw new Error(data.detail || "Request failed");
     }
 
-    conversationId = data.conversation_id;
-
-    appendMessage("bot", data.reply, {
-      sentiment: currentMode === "mental" ? data.sentiment : null,
-      crisis: data.is_crisis,
-    });
+    // Render tokens into the bot bubble as they stream in.
+    let meta = {};
+    let bubble = null;
+    let replyText = "";
+    for await (const { event, data } of readEvents(res)) {
+      if (event === "meta") {
+        meta = data;
+        conversationId = data.conversation_id;
+      } else if (event === "token" || event === "done") {
+        replyText = event === "done" ? data.reply : replyText + data.text;
+        if (!bubble) {
+          removeTyping();
+          bubble = appendMessage("bot", "", {
+            sentiment: currentMode === "mental" ? meta.sentiment : null,
+            crisis: meta.is_crisis,
+          });
+        }
+        bubble.replaceChildren(renderMarkdown(replyText));
+        messagesEl.scrollTop = messagesEl.scrollHeight;
+      } else if (event === "error") {
+        toast(data.detail || "Something went wrong", "error");
+      }
+    }
+    removeTyping();
+    if (!bubble) throw new Error("No response received");
 
-    if (currentMode === "legal") renderSources(data.sources || []);
-    if (data.is_crisis) toast("🚨 Crisis resources have been shared above.", "warning", 6000);
+    if (currentMode === "legal") renderSources(meta.sources || []);
+    if (meta.is_crisis) toast("🚨 Crisis resources have been shared above.", "warning", 6000);
 
     // Refresh conversation list (new conv may have been created)
     await loadConversations();
@@ -566,6 +701,7 @@ async function sendMessage(message) {
 // ─── New chat ─────────────────────────────────────────────────────────────────
 function startNewChat() {
   conversationId = null;
+  olderCursor = null;
   messagesEl.innerHTML = `
     <div class="welcome-state">
       <div class="welcome-icon">✦</div>
@@ -905,6 +1041,14 @@ forgotToggle.addEventListener("click", () => forgotPanel.classList.toggle("hidde
 // ─── Password strength ────────────────────────────────────────────────────────
 regPasswordEl.addEventListener("input", (e) => updateStrength(e.target.value));
 
+// ─── Paging on scroll ─────────────────────────────────────────────────────────
+messagesEl.addEventListener("scroll", () => {
+  if (messagesEl.scrollTop < 80) loadOlderMessages();
+});
+convList.addEventListener("scroll", () => {
+  if (convList.scrollTop + convList.clientHeight >= convList.scrollHeight - 40) loadMoreConversations();
+});
+
 // ─── Prompt chips on initial load ─────────────────────────────────────────────
 bindPromptChips();
 
@@ -0,0 +1,44 @@
+# migrations/env.py  (Alembic environment; reuses the app's engine configuration)
+from alembic import context
+
+from app import db as app_db
+
+config = context.config
+target_metadata = app_db.Base.metadata
+
+
+def run_migrations_offline():
+    context.configure(
+        url=app_db.DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        render_as_batch=app_db._using_sqlite(),
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    # init_db() passes its own connection; the CLI falls back to the app engine.
+    connection = config.attributes.get("connection")
+    if connection is None:
+        with app_db.engine.connect() as connection:
+            _run(connection)
+    else:
+        _run(connection)
+
+
+def _run(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,65 @@
+"""baseline schema (tables as created by init_db before migrations existed)
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001_baseline"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("username", sa.String(), unique=True, nullable=True),
+        sa.Column("email", sa.String(), unique=True, nullable=True),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_table(
+        "auth_users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("full_name", sa.String(), nullable=False),
+        sa.Column("phone", sa.String(), unique=True, nullable=False),
+        sa.Column("email", sa.String(), unique=True, nullable=False),
+        sa.Column("password_hash", sa.String(), nullable=False),
+        sa.Column("password_salt", sa.String(), nullable=False),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_table(
+        "conversations",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("section", sa.String()),
+        sa.Column("title", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_table(
+        "messages",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("conversation_id", sa.Integer(), sa.ForeignKey("conversations.id")),
+        sa.Column("sender", sa.String()),
+        sa.Column("text", sa.Text()),
+        sa.Column("sentiment", sa.JSON()),
+        sa.Column("is_crisis", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_table(
+        "rate_limits",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("auth_user_id", sa.Integer(), sa.ForeignKey("auth_users.id")),
+        sa.Column("window_start", sa.DateTime()),
+        sa.Column("request_count", sa.Integer()),
+    )
+
+
+def downgrade():
+    for table in ("rate_limits", "messages", "conversations", "auth_users", "users"):
+        op.drop_table(table)
@@ -0,0 +1,25 @@
+"""rolling summary columns on conversations
+
+Revision ID: 0002_conversation_summary
+Revises: 0001_baseline
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_conversation_summary"
+down_revision = "0001_baseline"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("conversations") as batch:
+        batch.add_column(sa.Column("summary", sa.Text(), nullable=True))
+        batch.add_column(sa.Column("summary_through", sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("conversations") as batch:
+        batch.drop_column("summary_through")
+        batch.drop_column("summary")
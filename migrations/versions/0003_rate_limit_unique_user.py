@@ -0,0 +1,28 @@
+"""one rate_limits row per user, so the shared limiter can upsert on it
+
+Revision ID: 0003_rate_limit_unique_user
+Revises: 0002_conversation_summary
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003_rate_limit_unique_user"
+down_revision = "0002_conversation_summary"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The old read-modify-write could race into duplicate rows; keep the newest per user.
+    op.execute(
+        sa.text(
+            "DELETE FROM rate_limits WHERE id NOT IN "
+            "(SELECT MAX(id) FROM rate_limits GROUP BY auth_user_id)"
+        )
+    )
+    op.create_index("uq_rate_limits_auth_user_id", "rate_limits", ["auth_user_id"], unique=True)
+
+
+def downgrade():
+    op.drop_index("uq_rate_limits_auth_user_id", table_name="rate_limits")
@@ -0,0 +1,57 @@
+"""link auth_users to the users row that owns their conversations
+
+Revision ID: 0004_auth_user_link
+Revises: 0003_rate_limit_unique_user
+Create Date: 2026-10-19
+
+Conversations used to be found through users.username == auth_users.full_name.
+The backfill links each account to its users row:
+  1. by email;
+  2. by username == full_name, only when no other account has the same name
+     (same-name accounts shared one users row and cannot be told apart);
+  3. otherwise a new users row is created for the account.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004_auth_user_link"
+down_revision = "0003_rate_limit_unique_user"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("auth_users") as batch:
+        batch.add_column(sa.Column("user_id", sa.Integer(), nullable=True))
+        batch.create_foreign_key("fk_auth_users_user_id", "users", ["user_id"], ["id"])
+
+    op.execute(sa.text(
+        "UPDATE auth_users SET user_id = "
+        "(SELECT u.id FROM users u WHERE u.email = auth_users.email) "
+        "WHERE user_id IS NULL"
+    ))
+    op.execute(sa.text(
+        "UPDATE auth_users SET user_id = "
+        "(SELECT MIN(u.id) FROM users u WHERE u.username = auth_users.full_name "
+        " AND u.id NOT IN (SELECT a.user_id FROM auth_users a WHERE a.user_id IS NOT NULL)) "
+        "WHERE user_id IS NULL "
+        "AND (SELECT COUNT(*) FROM auth_users a2 WHERE a2.full_name = auth_users.full_name) = 1"
+    ))
+    op.execute(sa.text(
+        "INSERT INTO users (email, created_at) "
+        "SELECT a.email, a.created_at FROM auth_users a "
+        "WHERE a.user_id IS NULL AND NOT EXISTS (SELECT 1 FROM users u WHERE u.email = a.email)"
+    ))
+    op.execute(sa.text(
+        "UPDATE auth_users SET user_id = "
+        "(SELECT u.id FROM users u WHERE u.email = auth_users.email) "
+        "WHERE user_id IS NULL"
+    ))
+    op.create_index("uq_auth_users_user_id", "auth_users", ["user_id"], unique=True)
+
+
+def downgrade():
+    op.drop_index("uq_auth_users_user_id", table_name="auth_users")
+    with op.batch_alter_table("auth_users") as batch:
+        batch.drop_constraint("fk_auth_users_user_id", type_="foreignkey")
+        batch.drop_column("user_id")
@@ -0,0 +1,24 @@
+"""composite indexes for the per-request access paths
+
+Revision ID: 0005_hot_path_indexes
+Revises: 0004_auth_user_link
+Create Date: 2026-10-19
+
+rate_limits.auth_user_id is already covered by uq_rate_limits_auth_user_id (0003).
+"""
+from alembic import op
+
+revision = "0005_hot_path_indexes"
+down_revision = "0004_auth_user_link"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_messages_conversation_id_id", "messages", ["conversation_id", "id"])
+    op.create_index("ix_conversations_user_id_created_at", "conversations", ["user_id", "created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_conversations_user_id_created_at", table_name="conversations")
+    op.drop_index("ix_messages_conversation_id_id", table_name="messages")
@@ -0,0 +1,42 @@
+"""denormalized last activity, preview and message count on conversations
+
+Revision ID: 0006_conversation_activity
+Revises: 0005_hot_path_indexes
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006_conversation_activity"
+down_revision = "0005_hot_path_indexes"
+branch_labels = None
+depends_on = None
+
+PREVIEW_CHARS = 120
+
+
+def upgrade():
+    with op.batch_alter_table("conversations") as batch:
+        batch.add_column(sa.Column("last_message_at", sa.DateTime(), nullable=True))
+        batch.add_column(sa.Column("last_message_preview", sa.String(), nullable=True))
+        batch.add_column(sa.Column("message_count", sa.Integer(), nullable=False, server_default="0"))
+
+    op.execute(sa.text(
+        "UPDATE conversations SET "
+        "message_count = (SELECT COUNT(*) FROM messages m WHERE m.conversation_id = conversations.id), "
+        "last_message_at = COALESCE("
+        " (SELECT MAX(m.created_at) FROM messages m WHERE m.conversation_id = conversations.id), created_at, CURRENT_TIMESTAMP), "
+        f"last_message_preview = (SELECT SUBSTR(m.text, 1, {PREVIEW_CHARS}) FROM messages m "
+        " WHERE m.conversation_id = conversations.id ORDER BY m.id DESC LIMIT 1)"
+    ))
+    op.create_index(
+        "ix_conversations_user_id_last_message_at", "conversations", ["user_id", "last_message_at", "id"]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_conversations_user_id_last_message_at", table_name="conversations")
+    with op.batch_alter_table("conversations") as batch:
+        batch.drop_column("message_count")
+        batch.drop_column("last_message_preview")
+        batch.drop_column("last_message_at")
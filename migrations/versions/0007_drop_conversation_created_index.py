@@ -0,0 +1,24 @@
+"""drop the created_at conversation index superseded by last-activity ordering
+
+Revision ID: 0007_drop_conversation_created_index
+Revises: 0006_conversation_activity
+Create Date: 2026-10-19
+
+The conversation list is ordered by last_message_at since 0006, so nothing reads
+ix_conversations_user_id_created_at any more; user_id lookups are covered by the
+leading column of ix_conversations_user_id_last_message_at.
+"""
+from alembic import op
+
+revision = "0007_drop_conversation_created_index"
+down_revision = "0006_conversation_activity"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index("ix_conversations_user_id_created_at", table_name="conversations")
+
+
+def downgrade():
+    op.create_index("ix_conversations_user_id_created_at", "conversations", ["user_id", "created_at"])
@@ -0,0 +1,45 @@
+"""
+Parity Tests — optimized sentiment backends vs. the full-precision pipeline.
+These load the real DistilBERT model, so they only run when requested and in a
+session where transformers is not mocked:
+
+    SENTIMENT_PARITY_TESTS=1 python -m pytest tests/test_sentiment_parity.py
+"""
+
+import os
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+pytestmark = pytest.mark.skipif(
+    os.getenv("SENTIMENT_PARITY_TESTS") != "1" or isinstance(sys.modules.get("transformers"), MagicMock),
+    reason="set SENTIMENT_PARITY_TESTS=1 and run this file on its own to load the real model",
+)
+
+SAMPLES = [
+    "I feel so alone and nobody seems to care about me.",
+    "Today was a really good day, I finally finished my project!",
+    "Everything is falling apart and I don't know what to do.",
+    "I'm grateful for my friends, they always support me.",
+    "I hate how tired I feel all the time.",
+    "Talking to you helps, thank you.",
+]
+
+
+@pytest.fixture(scope="module")
+def reference_labels():
+    from app.sentiment import load_pipeline
+    return [r["label"] for r in load_pipeline("torch")(SAMPLES)]
+
+
+# ══════════════════════════════════════════════════════════════════════════
+# PT-01  quantized / onnx backends agree with the torch pipeline on labels
+# ══════════════════════════════════════════════════════════════════════════
+@pytest.mark.parametrize("backend", ["quantized", "onnx"])
+def test_pt01_backend_label_parity(backend, reference_labels):
+    from app.sentiment import load_pipeline
+    if backend == "onnx":
+        pytest.importorskip("optimum.onnxruntime")
+    labels = [r["label"] for r in load_pipeline(backend)(SAMPLES)]
+    assert labels == reference_labels